@@ -0,0 +1,101 @@
+"""
+Checks the rule tables of pipe.py against the if/elif rules they were compiled from: the
+valid_*_actions functions of each position, the valid_actions_with_*_neighbor functions of each
+explored neighbor and piece_restrictions for the F neighbors.
+
+The original rules are the frozen copy in reference_rules.py. Both boards are set up with every
+combination of a piece and its neighbors on a 3x3 grid: each neighbor is an unexplored F piece, an
+unexplored piece of another class, or any piece in its final orientation. The valid rotations of the
+piece must be the same on both boards, except in the cases where the tables deliberately forbid more
+than the original rules, listed in known_difference.
+
+Usage:
+    python3 src/check_rules.py
+"""
+
+import itertools
+import sys
+
+import pipe
+from pipe import CLASS_SHIFT, CODE, DOMAIN_NAMES, FIXED, FORK, LOCKING, PIECE_CODES, PIECE_NAMES
+from reference_rules import ReferenceRules
+
+# Piece left in the cells that are not neighbors of the checked one
+FILLER = 'LH'
+
+# States of a neighbor: unexplored F piece, unexplored piece of another class, or a piece in its final orientation
+NEIGHBOR_STATES = [('FC', False), ('LH', False)] + [(name, True) for name in PIECE_CODES]
+
+def known_difference(piece: str, locking: int, original: set, compiled: set) -> bool:
+    """
+    Checks if a difference between both rules is one of the cases where the tables forbid more:
+    a B piece with three F neighbors, or any piece surrounded by four, always closes a network early.
+
+    Args:
+        piece (str): The checked piece.
+        locking (int): The number of its neighbors that are F pieces.
+        original (set): The valid rotations of the original rules.
+        compiled (set): The valid rotations of the tables.
+
+    Returns:
+        bool: True if the difference is expected, False otherwise.
+    """
+    piece_class = PIECE_CODES[piece] >> CLASS_SHIFT
+    return compiled < original and (locking == 4 or piece_class == FORK and locking == 3)
+
+def check() -> tuple:
+    """
+    Compares the valid rotations of both boards for every piece, position and neighbors on a 3x3 grid.
+
+    Returns:
+        tuple: The number of cases checked, the number of known differences, and the unexpected ones.
+    """
+    size = 3
+    board = pipe.Board([[FILLER] * size for _ in range(size)])
+    original_board = ReferenceRules([[PIECE_CODES[FILLER]] * size for _ in range(size)])
+    checked = 0
+    known = 0
+    unexpected = []
+
+    for row, col in itertools.product(range(size), repeat=2):
+        neighbors = [(row + row_step, col + col_step) for row_step, col_step in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                     if 0 <= row + row_step < size and 0 <= col + col_step < size]
+        border = row in (0, size - 1) or col in (0, size - 1)
+        for piece in PIECE_CODES:
+            code = PIECE_CODES[piece]
+            for states in itertools.product(NEIGHBOR_STATES, repeat=len(neighbors)):
+                # Set up the same cells on both boards
+                for target in (board, original_board):
+                    for cells_row in target.cells:
+                        cells_row[:] = [PIECE_CODES[FILLER]] * size
+                    target.cells[row][col] = code
+                    for (neighbor_row, neighbor_col), (name, fixed) in zip(neighbors, states):
+                        target.cells[neighbor_row][neighbor_col] = PIECE_CODES[name] | (FIXED if fixed else 0)
+
+                # The original rules: the rotations allowed by the position, on the border only, that are
+                # also allowed by the explored neighbors and the F neighbors
+                original = set(original_board.get_valid_rotations_neighbors(code, row, col))
+                if border:
+                    original &= set(original_board.get_valid_rotations_pos(code, row, col))
+                original = {PIECE_NAMES[rotation] for rotation in original}
+
+                # The rule tables
+                domain = board.compute_domain(code, row, col)
+                compiled = set(DOMAIN_NAMES[(code & CODE) >> CLASS_SHIFT][domain])
+
+                checked += 1
+                if original == compiled:
+                    continue
+                locking = sum(PIECE_CODES[name] >> CLASS_SHIFT == LOCKING for name, _ in states)
+                if known_difference(piece, locking, original, compiled):
+                    known += 1
+                else:
+                    unexpected.append((piece, row, col, states, sorted(original), sorted(compiled)))
+    return checked, known, unexpected
+
+if __name__ == "__main__":
+    checked, known, unexpected = check()
+    print(f"{checked} cases checked, {known} known differences, {len(unexpected)} unexpected differences")
+    for difference in unexpected[:20]:
+        print(*difference)
+    sys.exit(1 if unexpected else 0)
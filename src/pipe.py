@@ -8,15 +8,848 @@ from search import (
     astar_search,
     breadth_first_tree_search,
     depth_first_tree_search,
+    depth_first_trail_search,
     greedy_search,
     recursive_best_first_search,
 )
+from utils import SpillingPriorityQueue, SpillingQueue
 
+import argparse
+import functools
+import mmap
+import os
+import random
 import sys
-from collections import deque
+
+import numpy as np
+
+# Connection directions of a piece, encoded as the bits of a 4-bit mask
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+
+# Piece classes, stored in the two bits above the connection mask
+LOCKING = 0     # F pieces
+FORK = 1        # B pieces
+RETURN = 2      # V pieces
+STRAIGHT = 3    # L pieces
+CLASS_SHIFT = 4
+
+# Masks to extract the connections and the piece code (class and connections) from a cell
+CONNECTIONS = 0x0F
+CODE = 0x3F
+
+# Flag of a cell that is already in its final orientation (replaces the ' ' sentinel)
+FIXED = 0x40
+
+# Bits of a cell holding its domain: bit k is set while the k-th rotation of ROTATIONS is still valid
+DOMAIN_SHIFT = 8
+DOMAIN = 0x0F << DOMAIN_SHIFT
+
+# Piece codes: the piece class followed by the directions the piece connects to
+FC = LOCKING << CLASS_SHIFT | UP
+FB = LOCKING << CLASS_SHIFT | DOWN
+FE = LOCKING << CLASS_SHIFT | LEFT
+FD = LOCKING << CLASS_SHIFT | RIGHT
+BC = FORK << CLASS_SHIFT | UP | LEFT | RIGHT
+BB = FORK << CLASS_SHIFT | DOWN | LEFT | RIGHT
+BE = FORK << CLASS_SHIFT | UP | DOWN | LEFT
+BD = FORK << CLASS_SHIFT | UP | DOWN | RIGHT
+VC = RETURN << CLASS_SHIFT | UP | LEFT
+VB = RETURN << CLASS_SHIFT | DOWN | RIGHT
+VE = RETURN << CLASS_SHIFT | DOWN | LEFT
+VD = RETURN << CLASS_SHIFT | UP | RIGHT
+LH = STRAIGHT << CLASS_SHIFT | LEFT | RIGHT
+LV = STRAIGHT << CLASS_SHIFT | UP | DOWN
+
+# Translation between the text format and the piece codes
+PIECE_CODES = {
+    'FC': FC, 'FB': FB, 'FE': FE, 'FD': FD,
+    'BC': BC, 'BB': BB, 'BE': BE, 'BD': BD,
+    'VC': VC, 'VB': VB, 'VE': VE, 'VD': VD,
+    'LH': LH, 'LV': LV,
+}
+PIECE_NAMES = {code: piece for piece, code in PIECE_CODES.items()}
+
+# All possible orientations of each piece class
+ROTATIONS = {
+    LOCKING: [FC, FB, FE, FD],
+    FORK: [BC, BB, BE, BD],
+    RETURN: [VC, VB, VE, VD],
+    STRAIGHT: [LH, LV],
+}
+
+# Each direction paired with the direction that points back from the neighbor
+NEIGHBOR_DIRECTIONS = ((UP, DOWN), (DOWN, UP), (LEFT, RIGHT), (RIGHT, LEFT))
+
+# Position of each piece code in the rotations of its class
+ROTATION_INDEX = [0] * (CODE + 1)
+for rotations in ROTATIONS.values():
+    for k, rotation in enumerate(rotations):
+        ROTATION_INDEX[rotation] = k
+
+# Number of connections of each piece code
+CONNECTION_COUNTS = [bin(code & CONNECTIONS).count('1') for code in range(CODE + 1)]
+
+# Piece names of the rotations in each domain, per class: DOMAIN_NAMES[piece class][domain]
+DOMAIN_NAMES = {
+    piece_class: [tuple(PIECE_NAMES[rotation] for k, rotation in enumerate(rotations) if domain >> k & 1)
+                  for domain in range(16)]
+    for piece_class, rotations in ROTATIONS.items()
+}
+
+# Packed format of the cells in a snapshot, one byte per cell: the position of the piece code in PIECE_CODES
+# for an explored cell, and PACKED_PIECES + 16 * position + domain for a cell still to explore
+PACKED_PIECES = len(PIECE_CODES)
+PACKED_CELLS = [0] * ((DOMAIN | FIXED | CODE) + 1)
+UNPACKED_CELLS = [0] * 256
+for position, code in enumerate(PIECE_CODES.values()):
+    PACKED_CELLS[code | FIXED] = position
+    PACKED_CELLS[code | FIXED | 1 << ROTATION_INDEX[code] + DOMAIN_SHIFT] = position
+    UNPACKED_CELLS[position] = code | FIXED | 1 << ROTATION_INDEX[code] + DOMAIN_SHIFT
+    for domain in range(16):
+        PACKED_CELLS[code | domain << DOMAIN_SHIFT] = PACKED_PIECES + 16 * position + domain
+        UNPACKED_CELLS[PACKED_PIECES + 16 * position + domain] = code | domain << DOMAIN_SHIFT
+
+def rotation_domain(rotations: list) -> int:
+    """
+    Converts a list of piece codes of the same class into a domain bitset.
+
+    Args:
+        rotations (list): The piece codes.
+
+    Returns:
+        int: The bitset with bit k set for each code that is the k-th rotation of its class.
+    """
+    domain = 0
+    for rotation in rotations:
+        domain |= 1 << ROTATION_INDEX[rotation]
+    return domain
+
+# Piece codes of the rotations in each domain, per class: DOMAIN_ROTATIONS[piece class][domain]
+DOMAIN_ROTATIONS = {
+    piece_class: [[rotation for k, rotation in enumerate(rotations) if domain >> k & 1] for domain in range(16)]
+    for piece_class, rotations in ROTATIONS.items()
+}
+
+# Directions that every rotation of a domain connects to, and that some rotation of it connects to, per class:
+# ALWAYS_CONNECTIONS[piece class][domain] and ANY_CONNECTIONS[piece class][domain]
+ALWAYS_CONNECTIONS = {
+    piece_class: [functools.reduce(lambda mask, rotation: mask & rotation, rotations, CONNECTIONS) & CONNECTIONS
+                  for rotations in DOMAIN_ROTATIONS[piece_class]]
+    for piece_class in ROTATIONS
+}
+ANY_CONNECTIONS = {
+    piece_class: [functools.reduce(lambda mask, rotation: mask | rotation, rotations, 0) & CONNECTIONS
+                  for rotations in DOMAIN_ROTATIONS[piece_class]]
+    for piece_class in ROTATIONS
+}
+
+# Rules of the puzzle, compiled from the connections of each rotation into domains shifted into the domain bits
+# of a cell. A piece must connect to every neighbor in its final position that connects back to it, and must not
+# connect to the other neighbors in their final position or outside the grid:
+# CONNECTION_DOMAINS[directions it must connect to][directions it must not connect to][piece class]
+CONNECTION_DOMAINS = [
+    [[rotation_domain([rotation for rotation in rotations if rotation & must == must and not rotation & forbidden])
+      << DOMAIN_SHIFT for rotations in ROTATIONS.values()]
+     for forbidden in range(16)]
+    for must in range(16)
+]
+
+# A piece cannot have all of its connections leading to F pieces, or it would close a network:
+# LOCKING_DOMAINS[directions that lead to F pieces][piece class]
+LOCKING_DOMAINS = [
+    [rotation_domain([rotation for rotation in rotations
+                      if bin(rotation & locking).count('1') < bin(rotation & CONNECTIONS).count('1')])
+     << DOMAIN_SHIFT for rotations in ROTATIONS.values()]
+    for locking in range(16)
+]
+
+# Domains allowed by the limits of the grid: POSITION_DOMAINS[directions that lead outside the grid][piece class]
+POSITION_DOMAINS = [CONNECTION_DOMAINS[0][position] for position in range(16)]
+
+# Domains left by a neighbor in its final position:
+# FIXED_NEIGHBOR_DOMAINS[direction of the neighbor][whether it connects back][piece class]
+FIXED_NEIGHBOR_DOMAINS = {
+    direction: [CONNECTION_DOMAINS[0][direction], CONNECTION_DOMAINS[direction][0]]
+    for direction in (UP, DOWN, LEFT, RIGHT)
+}
+
+# Position class of each cell, per number of rows
+GRID_POSITIONS = {}
+
+def grid_positions(size: int) -> list:
+    """
+    Returns the position class of each cell of a square grid: the directions that lead outside the grid,
+    0 for the cells that are not in the outer border. The grid is computed once per size.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The position class of each cell, as a list of rows.
+    """
+    if size not in GRID_POSITIONS:
+        GRID_POSITIONS[size] = [
+            [(UP if row == 0 else 0) | (DOWN if row == size - 1 else 0) | (LEFT if col == 0 else 0) | (RIGHT if col == size - 1 else 0)
+             for col in range(size)]
+            for row in range(size)
+        ]
+    return GRID_POSITIONS[size]
+
+# States of the edge between two neighbor cells: not known yet, a connection, or no connection
+EDGE_UNKNOWN = 0
+EDGE_OPEN = 1
+EDGE_CLOSED = 2
+
+# Edge layout of each grid, per number of rows
+EDGE_LAYOUTS = {}
+
+def edge_layout(size: int) -> tuple:
+    """
+    Returns the edge layout of a square grid. The edges are kept in a single list: first the
+    horizontal lines of vertical edges, (size + 1) rows of size edges from the top of the grid,
+    then the vertical lines of horizontal edges, size rows of (size + 1) edges from the left.
+    The layout is computed once per size.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        tuple: For each cell, in row-major order, its four (direction, edge index, neighbor row, neighbor col),
+            and the initial edges, closed along the limits of the grid and unknown elsewhere.
+    """
+    if size not in EDGE_LAYOUTS:
+        horizontal_start = (size + 1) * size
+        cell_edges = [
+            ((UP, row * size + col, row - 1, col),
+             (DOWN, (row + 1) * size + col, row + 1, col),
+             (LEFT, horizontal_start + row * (size + 1) + col, row, col - 1),
+             (RIGHT, horizontal_start + row * (size + 1) + col + 1, row, col + 1))
+            for row in range(size) for col in range(size)
+        ]
+        edges = [EDGE_UNKNOWN] * (2 * (size + 1) * size)
+        for row, col in ((row, col) for row in range(size) for col in range(size)):
+            for direction, edge, neighbor_row, neighbor_col in cell_edges[row * size + col]:
+                if not (0 <= neighbor_row < size and 0 <= neighbor_col < size):
+                    edges[edge] = EDGE_CLOSED
+        EDGE_LAYOUTS[size] = cell_edges, edges
+    return EDGE_LAYOUTS[size]
+
+def diagonal_cells(size: int) -> list:
+    """
+    Returns the positions of a square grid in diagonal order, from the upper left corner
+    to the lower right corner.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, one anti-diagonal after the other.
+    """
+    return [(row, s - row) for s in range(2 * size - 1) for row in range(max(0, s - size + 1), min(s + 1, size))]
+
+def center_cells(size: int) -> list:
+    """
+    Returns the positions of a square grid from the center outwards, by Manhattan distance to the center.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, in row-major order for the same distance.
+    """
+    center = size // 2
+    return sorted(row_major_cells(size), key=lambda position: abs(position[0] - center) + abs(position[1] - center))
+
+def shell_cells(size: int) -> list:
+    """
+    Returns the positions of a square grid one shell after the other, from the outer border inwards.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, in row-major order within each shell.
+    """
+    return sorted(row_major_cells(size), key=lambda position: min(position[0], position[1],
+                                                                  size - 1 - position[0], size - 1 - position[1]))
+
+def row_major_cells(size: int) -> list:
+    """
+    Returns the positions of a square grid row by row.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, from left to right in each row.
+    """
+    return [(row, col) for row in range(size) for col in range(size)]
+
+def spiral_cells(size: int) -> list:
+    """
+    Returns the positions of a square grid along a clockwise spiral, from the upper left corner inwards.
+    Unlike the shells, each position is next to the one before it.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, one turn of the spiral after the other.
+    """
+    positions = []
+    for shell in range((size + 1) // 2):
+        last = size - 1 - shell
+        if shell == last:
+            positions.append((shell, shell))
+            break
+        positions.extend((shell, col) for col in range(shell, last))
+        positions.extend((row, last) for row in range(shell, last))
+        positions.extend((last, col) for col in range(last, shell, -1))
+        positions.extend((row, shell) for row in range(last, shell, -1))
+    return positions
+
+# Static branching orders: each builds the positions of a grid in the order they are branched on
+STATIC_ORDERS = {
+    'diagonal': diagonal_cells,
+    'center': center_cells,
+    'shells': shell_cells,
+    'row-major': row_major_cells,
+    'spiral': spiral_cells,
+}
+
+# Cells of each grid in each static order, per order name and number of rows
+CELL_ORDERS = {}
+
+def cell_order(name: str, size: int) -> list:
+    """
+    Returns the positions of a square grid in a static branching order. The order is computed
+    once per name and size.
+
+    Args:
+        name (str): The name of the order in STATIC_ORDERS.
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        list: The (row, col) positions, in the order they are branched on.
+    """
+    if (name, size) not in CELL_ORDERS:
+        CELL_ORDERS[name, size] = STATIC_ORDERS[name](size)
+    return CELL_ORDERS[name, size]
+
+# Random keys of the Zobrist hash, per number of cells
+ZOBRIST_KEYS = {}
+
+def zobrist_keys(size: int) -> list:
+    """
+    Returns the Zobrist keys of a board, one random 64-bit key per cell and rotation index.
+    The keys are generated once per board size, from a fixed seed.
+
+    Args:
+        size (int): The number of cells of the board.
+
+    Returns:
+        list: The keys, where the key of rotation k at cell index i is at position 4 * i + k.
+    """
+    if size not in ZOBRIST_KEYS:
+        generator = random.Random(size)
+        ZOBRIST_KEYS[size] = [generator.getrandbits(64) for _ in range(4 * size)]
+    return ZOBRIST_KEYS[size]
+
+def forced_literals(implications: list):
+    """
+    Solves a 2-SAT problem given by its implication graph, where literal 2 * v states that variable v
+    is true and literal 2 * v + 1 that it is false. The strongly connected components are found with
+    an iterative Tarjan search, which emits them in reverse topological order, so the components
+    reachable from each one are gathered in a bitset as it is emitted. A literal holds in every
+    solution when its negation reaches it.
+
+    Args:
+        implications (list): The literals implied by each literal.
+
+    Returns:
+        list: The literals that hold in every solution, or None if the problem has no solution.
+    """
+    size = len(implications)
+    indices = [-1] * size
+    lowlinks = [0] * size
+    components = [-1] * size
+    reachable = []
+    stack = []
+    counter = 0
+
+    for root in range(size):
+        if indices[root] != -1:
+            continue
+        indices[root] = lowlinks[root] = counter
+        counter += 1
+        stack.append(root)
+        path = [(root, 0)]
+        while path:
+            literal, position = path[-1]
+            successors = implications[literal]
+
+            # Visit the next successor not yet visited
+            if position < len(successors):
+                path[-1] = (literal, position + 1)
+                successor = successors[position]
+                if indices[successor] == -1:
+                    indices[successor] = lowlinks[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    path.append((successor, 0))
+                elif components[successor] == -1:
+                    lowlinks[literal] = min(lowlinks[literal], indices[successor])
+                continue
+
+            # Every successor is visited: emit the component if the literal is its root
+            path.pop()
+            if path:
+                parent = path[-1][0]
+                lowlinks[parent] = min(lowlinks[parent], lowlinks[literal])
+            if lowlinks[literal] != indices[literal]:
+                continue
+            component = len(reachable)
+            members = []
+            while True:
+                member = stack.pop()
+                components[member] = component
+                members.append(member)
+                if member == literal:
+                    break
+            reach = 1 << component
+            for member in members:
+                for successor in implications[member]:
+                    reach |= reachable[components[successor]] if components[successor] != component else 0
+            reachable.append(reach)
+
+    forced = []
+    for literal in range(0, size, 2):
+        positive, negative = components[literal], components[literal + 1]
+        if positive == negative:
+            return None
+        if reachable[negative] >> positive & 1:
+            forced.append(literal)
+        elif reachable[positive] >> negative & 1:
+            forced.append(literal + 1)
+    return forced
+
+# Pattern database of the 2x2 windows of the grid, with the cells of a window numbered 0 and 1 in its upper row
+# and 2 and 3 in its lower row. A window is described by the classes of its cells, c0 | c1 << 2 | c2 << 4 | c3 << 6,
+# and by its context, the sides of the window that lie on the limits of the grid, UP | DOWN | LEFT | RIGHT. For each
+# of them, the database keeps a 256-bit set of the rotation tuples k0 | k1 << 2 | k2 << 4 | k3 << 6 that are
+# consistent inside the window.
+PATTERNS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patterns.bin')
+PATTERN_BYTES = 32
+
+# Rotation tuples of a window whose i-th cell has a rotation in a domain: WINDOW_TUPLES[i][domain]
+WINDOW_TUPLES = [[sum(1 << window for window in range(256) if domain >> (window >> 2 * i & 3) & 1) for domain in range(16)]
+                 for i in range(4)]
+
+# Pattern database, memory-mapped on first use
+PATTERN_TABLES = {}
+
+def window_patterns(classes: int, context: int) -> int:
+    """
+    Computes the rotation tuples of a 2x2 window that are consistent inside the window: neighbors agree
+    about the connections between them, no connection leads outside the grid, the four cells do not
+    close a cycle, and no group of cells closes a network before covering the whole board.
+
+    Args:
+        classes (int): The piece classes of the cells of the window.
+        context (int): The sides of the window that lie on the limits of the grid.
+
+    Returns:
+        int: The bitset of the consistent rotation tuples.
+    """
+    outside = [context & (UP | LEFT), context & (UP | RIGHT), context & (DOWN | LEFT), context & (DOWN | RIGHT)]
+    links = ((0, 1, RIGHT, LEFT), (2, 3, RIGHT, LEFT), (0, 2, DOWN, UP), (1, 3, DOWN, UP))
+    patterns = 0
+    for window in range(256):
+        rotations = [ROTATIONS[classes >> 2 * i & 3] for i in range(4)]
+        indices = [window >> 2 * i & 3 for i in range(4)]
+        if any(k >= len(cell_rotations) for k, cell_rotations in zip(indices, rotations)):
+            continue
+        pieces = [cell_rotations[k] for k, cell_rotations in zip(indices, rotations)]
+        if any(piece & limits for piece, limits in zip(pieces, outside)):
+            continue
+
+        # Neighbors in the window must agree, and the four links together would close a cycle
+        open_links = [(first, second) for first, second, direction, opposite in links
+                      if pieces[first] & direction and pieces[second] & opposite]
+        if any(bool(pieces[first] & direction) != bool(pieces[second] & opposite)
+               for first, second, direction, opposite in links) or len(open_links) == 4:
+            continue
+
+        # Group the cells by their links, and reject a group whose connections all stay inside the window
+        groups = list(range(4))
+        for first, second in open_links:
+            groups = [groups[first] if group == groups[second] else group for group in groups]
+        inner = {RIGHT: (0, 2), LEFT: (1, 3), DOWN: (0, 1), UP: (2, 3)}
+        closed = False
+        for group in set(groups):
+            members = [i for i in range(4) if groups[i] == group]
+            leaves = any(pieces[i] & direction and i not in cells for i in members for direction, cells in inner.items())
+            if not leaves and not (context == UP | DOWN | LEFT | RIGHT and len(members) == 4):
+                closed = True
+        if not closed:
+            patterns |= 1 << window
+    return patterns
+
+def build_patterns(path: str = PATTERNS_PATH):
+    """
+    Generates the pattern database of the 2x2 windows and writes it to a binary file.
+
+    Args:
+        path (str): The path of the file.
+    """
+    with open(path, 'wb') as file:
+        for classes in range(256):
+            for context in range(16):
+                file.write(window_patterns(classes, context).to_bytes(PATTERN_BYTES, 'little'))
+
+def pattern_table(path: str = PATTERNS_PATH) -> mmap.mmap:
+    """
+    Returns the pattern database of the 2x2 windows, memory-mapped from its binary file, which is
+    generated first if it does not exist.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        mmap.mmap: The read-only map of the file.
+    """
+    if path not in PATTERN_TABLES:
+        if not os.path.exists(path):
+            build_patterns(path)
+        with open(path, 'rb') as file:
+            PATTERN_TABLES[path] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return PATTERN_TABLES[path]
+
+# Lookup table for the vectorized board: the number of bits of each 4-bit set
+BIT_COUNTS = np.array([bin(mask).count('1') for mask in range(16)], dtype=np.uint8)
+PACKED_CELLS_ARRAY = np.array(PACKED_CELLS, dtype=np.uint8)
+UNPACKED_CELLS_ARRAY = np.array(UNPACKED_CELLS, dtype=np.uint16)
+
+# Row of the trail entries that record a set of the union-find instead of a cell
+SETS_ENTRY = -1
+
+class UnionFind:
+    """
+    Disjoint sets of cells, with union by rank, used to follow the components formed by the
+    connections between explored pieces as they are placed. Each component also counts its cells
+    and its open ends, the connections that do not lead to an explored piece yet.
+    The entries of the cells are kept in one chunk per row of the board, shared between copies and
+    only copied by the first copy that writes to them, and every write can be recorded in the trail
+    of a board. Paths are not compressed, so that undoing a union only restores the roots it changed.
+    """
+
+    __slots__ = ('width', 'chunks', 'owned_rows', 'count', 'open_ends')
+
+    def __init__(self, size: int, width: int):
+        """
+        Initializes a UnionFind object with every cell in a set of its own.
+
+        Args:
+            size (int): The number of cells.
+            width (int): The number of cells in each row of the board.
+        """
+        self.width = width
+
+        # Parent, rank, number of cells and number of open ends of each cell, four entries per cell;
+        # the number of cells and of open ends of a component are kept in its representative
+        self.chunks = [[entry for index in range(start, start + width) for entry in (index, 0, 1, 0)]
+                       for start in range(0, size, width)]
+
+        # Whether each chunk belongs to this object only, so that it can be written in place
+        self.owned_rows = [True] * len(self.chunks)
+
+        # Number of components of the explored cells, counted as they are added
+        self.count = 0
+
+        # Total number of open ends of the components
+        self.open_ends = 0
+
+    def copy(self):
+        """
+        Creates a copy of the sets, to be modified by a new board. The chunks are shared between
+        both objects and only copied by the first one that writes to them.
+
+        Returns:
+            UnionFind: A new object with the same sets.
+        """
+        new_sets = UnionFind.__new__(UnionFind)
+        new_sets.width = self.width
+        new_sets.chunks = self.chunks[:]
+        new_sets.owned_rows = [False] * len(self.chunks)
+        self.owned_rows = [False] * len(self.chunks)
+        new_sets.count = self.count
+        new_sets.open_ends = self.open_ends
+        return new_sets
+
+    def entries(self, index: int, trail: list = None) -> tuple:
+        """
+        Prepares the entries of a cell to be written: copies its chunk if it is shared with another
+        object, and records the entries in a trail.
+
+        Args:
+            index (int): The flat index of the cell.
+            trail (list): The trail of the board, or None if the board does not record its writes.
+
+        Returns:
+            tuple: The chunk of the cell, that can be written in place, and the position of its entries.
+        """
+        row, col = divmod(index, self.width)
+        if not self.owned_rows[row]:
+            self.chunks[row] = self.chunks[row][:]
+            self.owned_rows[row] = True
+        chunk, start = self.chunks[row], col * 4
+        if trail is not None:
+            trail.append((SETS_ENTRY, index, tuple(chunk[start:start + 4])))
+        return chunk, start
+
+    def restore(self, index: int, entries: tuple):
+        """
+        Writes back the entries of a cell recorded in a trail.
+
+        Args:
+            index (int): The flat index of the cell.
+            entries (tuple): The parent, rank, number of cells and number of open ends of the cell.
+        """
+        chunk, start = self.entries(index)
+        chunk[start:start + 4] = entries
+
+    def add(self, index: int, ends: int, trail: list = None):
+        """
+        Adds an explored cell as a component of its own.
+
+        Args:
+            index (int): The flat index of the cell.
+            ends (int): The number of connections of its piece.
+            trail (list): The trail that records the write, if any.
+        """
+        chunk, start = self.entries(index, trail)
+        chunk[start + 3] = ends
+        self.count += 1
+        self.open_ends += ends
+
+    def find(self, index: int) -> int:
+        """
+        Finds the representative of the set of a cell.
+
+        Args:
+            index (int): The flat index of the cell.
+
+        Returns:
+            int: The flat index of the representative.
+        """
+        chunks = self.chunks
+        width = self.width
+        while True:
+            parent = chunks[index // width][index % width * 4]
+            if parent == index:
+                return index
+            index = parent
+
+    def union(self, first: int, second: int, trail: list = None) -> bool:
+        """
+        Merges the sets of two connected cells. The connection closes one open end of each cell.
+
+        Args:
+            first (int): The flat index of the first cell.
+            second (int): The flat index of the second cell.
+            trail (list): The trail that records the writes, if any.
+
+        Returns:
+            bool: False if both cells were already in the same set, so the connection closes a cycle, True otherwise.
+        """
+        first, second = self.find(first), self.find(second)
+        self.open_ends -= 2
+        first_chunk, first_start = self.entries(first, trail)
+        if first == second:
+            first_chunk[first_start + 3] -= 2
+            return False
+        second_chunk, second_start = self.entries(second, trail)
+        if first_chunk[first_start + 1] < second_chunk[second_start + 1]:
+            first, first_chunk, first_start, second_chunk, second_start = \
+                second, second_chunk, second_start, first_chunk, first_start
+        second_chunk[second_start] = first
+        if first_chunk[first_start + 1] == second_chunk[second_start + 1]:
+            first_chunk[first_start + 1] += 1
+        first_chunk[first_start + 2] += second_chunk[second_start + 2]
+        first_chunk[first_start + 3] += second_chunk[second_start + 3] - 2
+        self.count -= 1
+        return True
+
+    def size(self, index: int) -> int:
+        """
+        Counts the cells in the component of a cell.
+
+        Args:
+            index (int): The flat index of the cell.
+
+        Returns:
+            int: The number of cells of the component.
+        """
+        root = self.find(index)
+        return self.chunks[root // self.width][root % self.width * 4 + 2]
+
+    def is_closed(self, index: int) -> bool:
+        """
+        Checks if the component of a cell has no open ends left, so no other piece can ever join it.
+
+        Args:
+            index (int): The flat index of the cell.
+
+        Returns:
+            bool: True if the component is closed, False otherwise.
+        """
+        root = self.find(index)
+        return not self.chunks[root // self.width][root % self.width * 4 + 3]
+
+class DomainBuckets:
+    """
+    Unexplored cells with more than one valid rotation, kept in buckets by the size of their domain and,
+    for the same size, by their number of explored neighbors, so that the most constrained cell is found
+    without scanning the board. The buckets are kept in one chunk per row of the board, shared between
+    copies and only copied by the first copy that writes to them: each chunk holds one dictionary per
+    bucket, used as an ordered set of the columns in it, and a bitset of the buckets that are not empty.
+    """
+
+    __slots__ = ('rows', 'keys', 'masks', 'counts', 'owned_rows', 'stamp')
+
+    # Number of buckets: domains of 2, 3 or 4 rotations, with 0 to 4 explored neighbors each
+    SIZE = 15
+
+    def __init__(self, num_rows: int, num_cols: int):
+        """
+        Initializes an empty DomainBuckets object.
+
+        Args:
+            num_rows (int): The number of rows of the board.
+            num_cols (int): The number of columns of the board.
+        """
+        # Buckets of each row, each mapping a column to the time it was moved to the bucket
+        self.rows = [[{} for _ in range(DomainBuckets.SIZE)] for _ in range(num_rows)]
+
+        # Bucket of each position, to find it again when it moves
+        self.keys = [[None] * num_cols for _ in range(num_rows)]
+
+        # Buckets of each row that are not empty, as a bitset
+        self.masks = [0] * num_rows
+
+        # Number of positions in each bucket, over every row
+        self.counts = [0] * DomainBuckets.SIZE
+
+        # Whether the chunk of each row belongs to this object only, so that it can be written in place
+        self.owned_rows = [True] * num_rows
+
+        # Number of moves so far, to order the positions of the same bucket across rows
+        self.stamp = 0
+
+    def copy(self):
+        """
+        Creates a copy of the buckets, to be modified by a new board. The chunks are shared between
+        both objects and only copied by the first one that writes to them.
+
+        Returns:
+            DomainBuckets: A new object with the same positions in the same buckets.
+        """
+        new_buckets = DomainBuckets.__new__(DomainBuckets)
+        new_buckets.rows = self.rows[:]
+        new_buckets.keys = self.keys[:]
+        new_buckets.masks = self.masks[:]
+        new_buckets.counts = self.counts[:]
+        new_buckets.owned_rows = [False] * len(self.rows)
+        self.owned_rows = [False] * len(self.rows)
+        new_buckets.stamp = self.stamp
+        return new_buckets
+
+    def update(self, position: tuple, key):
+        """
+        Moves a position to another bucket.
+
+        Args:
+            position (tuple): The (row, col) position.
+            key (int): The new bucket of the position, or None to remove it.
+        """
+        row, col = position
+        old_key = self.keys[row][col]
+        if old_key is None and key is None:
+            return
+
+        # Copy a shared chunk before writing to it
+        if not self.owned_rows[row]:
+            self.rows[row] = [bucket.copy() for bucket in self.rows[row]]
+            self.keys[row] = self.keys[row][:]
+            self.owned_rows[row] = True
+        buckets = self.rows[row]
+
+        if old_key is not None:
+            bucket = buckets[old_key]
+            del bucket[col]
+            self.counts[old_key] -= 1
+            if not bucket:
+                self.masks[row] &= ~(1 << old_key)
+        if key is not None:
+            self.stamp += 1
+            buckets[key][col] = self.stamp
+            self.counts[key] += 1
+            self.masks[row] |= 1 << key
+        self.keys[row][col] = key
+
+    def first(self):
+        """
+        Returns the position in the first bucket that is not empty. Within a bucket, the position moved
+        last is returned first, so that the search keeps working next to the cells it just explored.
+
+        Returns:
+            tuple: The (row, col) position, or None if every bucket is empty.
+        """
+        key = next((key for key, count in enumerate(self.counts) if count), None)
+        if key is None:
+            return None
+        best = None
+        best_stamp = 0
+        for row, mask in enumerate(self.masks):
+            if mask >> key & 1:
+                col, stamp = next(reversed(self.rows[row][key].items()))
+                if stamp > best_stamp:
+                    best, best_stamp = (row, col), stamp
+        return best
+
+def most_constrained_cell(board):
+    """
+    Returns the unexplored cell with the fewest valid rotations, and then the most explored neighbors.
+    The buckets of a board that does not track them yet are built on the first call.
+
+    Args:
+        board (Board): A board that is not vectorized.
+
+    Returns:
+        tuple: The (row, col) position, or None if every cell with a choice left is explored.
+    """
+    if board.buckets is None:
+        board.track_domains()
+    return board.buckets.first()
+
+# Dynamic branching orders: each returns the position to branch on from the current board
+DYNAMIC_ORDERS = {
+    'mrv': most_constrained_cell,
+}
 
 class Board:
 
+    # Fixed set of attributes, so that boards carry no per-instance dictionary
+    __slots__ = ('cells', 'owned_rows', 'invalid', 'pending', 'cursor', 'action_count', 'board_size',
+                 'explored_count', 'num_rows', 'num_cols', 'last_action', 'trail', 'zobrist_keys', 'hash_key',
+                 'positions', 'components', 'changed', 'buckets')
+
+    # Whether the board answers neighbor queries for the whole board at once
+    vectorized = False
+
     def __init__(self, grid):
 
         """
@@ -26,17 +859,20 @@ class Board:
             grid (list): The grid layout representing the board.
         """
 
-        # Grid for the board
-        self.grid = grid
+        # Cells of the board, each holding a piece code, the FIXED flag and the domain of valid rotations
+        self.cells = [[PIECE_CODES[piece] for piece in row] for row in grid]
 
-        # Board for the board
-        self.board = self
+        # Rows of cells that belong only to this board; the others are shared with copies
+        self.owned_rows = [True] * len(grid)
 
         # Flag to check if the board is invalid
         self.invalid = False
 
-        # Auxiliar flag for the actions method
-        self.unique_to_be_explored = True
+        # Positions whose domain was narrowed down to a single rotation, still to be fixed by propagate
+        self.pending = []
+
+        # Position in the static branching order before which every piece is explored
+        self.cursor = 0
 
         # Number of actions taken
         self.action_count = 0
@@ -50,20 +886,234 @@ class Board:
         self.num_rows = len(grid)
 
         self.num_cols = len(grid)
-        
-        # Grid for the explored positions
-        self.explored_grid = [[' ' for _ in range(self.num_rows)] for _ in range(self.num_cols)]
 
         # Action that led to the current state
         self.last_action = None
 
+        # Previous values of the cells and sets written since the first checkpoint, used to undo them
+        self.trail = None
+
+        # Zobrist hash of the explored positions, kept up to date as pieces are fixed
+        self.zobrist_keys = zobrist_keys(self.board_size)
+        self.hash_key = 0
+
+        # Position class of each cell, the directions that lead outside the grid, shared by every copy of the board
+        self.positions = grid_positions(self.num_rows)
+
+        # Components formed by the connections between explored pieces
+        self.components = UnionFind(self.board_size, self.num_cols)
+
+        # Positions written since the last window filter, once filter_windows starts tracking them
+        self.changed = None
+
+        # Unexplored cells by the size of their domain, once track_domains starts tracking them
+        self.buckets = None
+
+        # Start every domain with the rotations allowed by the limits of the grid and the F pieces around
+        for row in range(self.num_rows):
+            for col in range(self.num_cols):
+                piece = self.cells[row][col]
+                domain = self.compute_domain(piece, row, col)
+                self.cells[row][col] = piece | domain << DOMAIN_SHIFT
+
+                # Queue the pieces with a single rotation, and mark the board as invalid if one has none
+                if not domain:
+                    self.invalid = True
+                elif not domain & domain - 1:
+                    self.pending.append((row, col))
+
+        # A solution is a spanning tree, with one connection less than its cells, each joining two pieces
+        if sum(CONNECTION_COUNTS[cell & CODE] for row in self.cells for cell in row) != 2 * (self.board_size - 1):
+            self.invalid = True
+
+    @property
+    def missing_connections(self) -> int:
+        """
+        Number of connections still missing for a spanning tree: one less than the components of the
+        explored pieces and the unexplored pieces together.
+        """
+        if self.components is None:
+            return self.board_size - self.explored_count
+        return self.board_size - self.explored_count + self.components.count - 1
+
+    @property
+    def board(self):
+        """
+        Board for the board, so that boards, snapshots and states can be used interchangeably as states.
+        """
+        return self
+
+    @property
+    def grid(self) -> list:
+        """
+        Grid layout of the board in the text format.
+        """
+        return [[PIECE_NAMES[cell & CODE] for cell in row] for row in self.cells]
+
+    @property
+    def explored_grid(self) -> list:
+        """
+        Grid of the pieces already in their final position, with ' ' for the positions still to explore.
+        """
+        return [[PIECE_NAMES[cell & CODE] if cell & FIXED else ' ' for cell in row] for row in self.cells]
+
+    def copy(self):
+        """
+        Creates a copy of the board, to be modified by a new state. The rows of cells are shared
+        between both boards and only copied by the first board that writes to them.
+
+        Returns:
+            Board: A new board with the same cells and explored positions.
+        """
+        new_board = type(self).__new__(type(self))
+        new_board.cells = self.cells[:]
+        new_board.owned_rows = [False] * self.num_rows
+        self.owned_rows = [False] * self.num_rows
+        new_board.invalid = False
+        new_board.pending = self.pending[:]
+        new_board.cursor = self.cursor
+        new_board.action_count = self.action_count
+        new_board.board_size = self.board_size
+        new_board.explored_count = self.explored_count
+        new_board.num_rows = self.num_rows
+        new_board.num_cols = self.num_cols
+        new_board.last_action = self.last_action
+        new_board.trail = None
+        new_board.zobrist_keys = self.zobrist_keys
+        new_board.hash_key = self.hash_key
+        new_board.positions = self.positions
+        new_board.components = self.components.copy()
+        new_board.changed = [] if self.changed is not None else None
+        new_board.buckets = self.buckets.copy() if self.buckets is not None else None
+        return new_board
+
+    def __hash__(self):
+        """
+        Hash of the explored positions, the same for every board that fixed the same pieces in any order.
+        """
+        return self.hash_key
+
+    def __eq__(self, other):
+        """
+        Checks if two boards (or a board and a state) have the same pieces in their final orientation.
+
+        Args:
+            other (Board, BoardSnapshot or PipeManiaState): The other board or state to compare with.
+        """
+        if not isinstance(other, (Board, BoardSnapshot, PipeManiaState)):
+            return NotImplemented
+        other = other.board
+        if self.hash_key != other.hash_key or self.explored_count != other.explored_count:
+            return False
+        return self.same_cells(other)
+
+    def same_cells(self, other) -> bool:
+        """
+        Compares the cells of two boards of the same instance. Rows shared between both boards are skipped.
+
+        Args:
+            other (Board): The other board.
+
+        Returns:
+            bool: True if every cell is equal, False otherwise.
+        """
+        for row, other_row in zip(self.cells, other.cells):
+            if row is not other_row and row != other_row:
+                return False
+        return True
+
+    def __reduce__(self):
+        """
+        Serializes the board through its packed snapshot, leaving out the tables shared between boards.
+        """
+        return type(self).from_snapshot, (self.pack(),)
+
+    def pack(self):
+        """
+        Creates a compact snapshot of the board, with one byte per cell.
+
+        Returns:
+            BoardSnapshot: The snapshot, to be unpacked back into a board when needed.
+        """
+        return BoardSnapshot(self, bytes([PACKED_CELLS[cell] for row in self.cells for cell in row]))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Rebuilds a board from a snapshot created by pack.
+
+        Args:
+            snapshot (BoardSnapshot): The snapshot of the board.
+
+        Returns:
+            Board: A new board with the cells and counters of the snapshot.
+        """
+        board = cls.__new__(cls)
+        data, num_cols = snapshot.data, snapshot.num_cols
+        board.cells = [[UNPACKED_CELLS[byte] for byte in data[start:start + num_cols]]
+                       for start in range(0, len(data), num_cols)]
+        board.owned_rows = [True] * len(board.cells)
+        snapshot.restore(board)
+        board.connect_components()
+        return board
+
+    def checkpoint(self) -> tuple:
+        """
+        Marks the current state of the board, so that it can be restored by undo. From the first
+        checkpoint on, every cell and set written by fix is recorded in the trail.
+
+        Returns:
+            tuple: The checkpoint, with the length of the trail and the board counters and flags.
+        """
+        if self.trail is None:
+            self.trail = []
+
+        # The sets record their writes in the trail, so only their counters are kept here
+        counters = (self.components.count, self.components.open_ends) if self.components is not None else None
+        return (len(self.trail), self.explored_count, self.hash_key, self.invalid, self.pending[:], self.cursor,
+                self.action_count, self.last_action, counters)
+
+    def undo(self, checkpoint: tuple):
+        """
+        Restores the board to the given checkpoint, unwinding the cells and sets written since then.
+
+        Args:
+            checkpoint (tuple): A checkpoint returned by the checkpoint method.
+        """
+        (position, self.explored_count, self.hash_key, self.invalid, pending, self.cursor,
+         self.action_count, self.last_action, counters) = checkpoint
+        self.pending = pending[:]
+        if counters is not None:
+            self.components.count, self.components.open_ends = counters
+        self.unwind(position)
+
+    def unwind(self, position: int):
+        """
+        Restores the cells and sets recorded in the trail after the given position, moving the cells back
+        to their buckets when the board tracks them.
+
+        Args:
+            position (int): The length of the trail to go back to.
+        """
+        trail = self.trail
+        cells = self.cells
+        while len(trail) > position:
+            row, col, value = trail.pop()
+            if row == SETS_ENTRY:
+                self.components.restore(col, value)
+            else:
+                changed = cells[row][col] ^ value
+                cells[row][col] = value
+                if self.buckets is not None:
+                    self.move_bucket(row, col, changed)
+
     def print(self):
         """
         Prints the grid layout.
 
         """
-        for row in self.grid:
-            print('\t'.join(row))
+        for row in self.cells:
+            print('\t'.join([PIECE_NAMES[cell & CODE] for cell in row]))
 
     def get_value(self, row: int, col: int) -> str:
         """
@@ -76,939 +1126,1704 @@ class Board:
         Returns:
             str: The piece identifier at the specified position.
         """
-        return self.grid[row][col]
+        return PIECE_NAMES[self.cells[row][col] & CODE]
 
-    def get_reachable_explored(self, row: int, col: int) -> list:
+    def is_explored(self, row: int, col: int) -> bool:
         """
-        Gets the reachable explored positions from the given position.
+        Checks if the piece at the given position is already in its final orientation.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
 
         Returns:
-            list: A list of reachable positions from the given position.
-        """
-        reachable = []
-        piece = self.get_value(row, col)
-        if piece in ('FC', 'BC', 'BE', 'BD', 'VC', 'VD', 'LV'):
-            if row > 0:
-                if self.explored_grid[row - 1][col] != ' ':
-                        reachable.append((row - 1, col))
-        if piece in ('FB', 'BB', 'BE', 'BD', 'VB', 'VE', 'LV'):
-            if row < self.num_rows - 1:
-                if self.explored_grid[row + 1][col] != ' ':
-                    reachable.append((row + 1, col))
-        if piece in ('FD', 'BC', 'BB', 'BD', 'VD', 'VB', 'LH'):
-            if col < self.num_cols - 1:
-                if self.explored_grid[row][col + 1] != ' ':
-                    reachable.append((row, col + 1))
-        if piece in ('FE', 'BC', 'BB', 'BE', 'VC', 'VE', 'LH'):
-            if col > 0:
-                if self.explored_grid[row][col - 1] != ' ':
-                    reachable.append((row, col - 1))
-
-        # Make sure the reachable positions are within the grid
-        reachable = [(r, c) for r, c in reachable if 0 <= r < self.num_rows and 0 <= c < self.num_cols]
-
-        return reachable
-    
-    # Auxiliar Functions to Check Position of the a Piece
+            bool: True if the position is explored, False otherwise.
+        """
+        return self.cells[row][col] & FIXED != 0
+
+    def fix(self, row: int, col: int, piece: int):
+        """
+        Places a piece in its final orientation at the given position.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            piece (int): The piece code of the final orientation.
+        """
+        piece = self.place(row, col, piece)
+
+        # Narrow the domains of the neighbors to the rotations that agree with the piece
+        if row > 0:
+            self.narrow(row - 1, col, FIXED_NEIGHBOR_DOMAINS[DOWN][piece & UP != 0])
+        if row < self.num_rows - 1:
+            self.narrow(row + 1, col, FIXED_NEIGHBOR_DOMAINS[UP][piece & DOWN != 0])
+        if col > 0:
+            self.narrow(row, col - 1, FIXED_NEIGHBOR_DOMAINS[RIGHT][piece & LEFT != 0])
+        if col < self.num_cols - 1:
+            self.narrow(row, col + 1, FIXED_NEIGHBOR_DOMAINS[LEFT][piece & RIGHT != 0])
 
-    def is_corner_upper_right(self, row: int, col: int) -> bool:
+    def place(self, row: int, col: int, piece: int) -> int:
         """
-        Checks if the position is the upper right corner of the grid.
+        Writes a piece in its final orientation at the given position, updating the counters and the hash,
+        without narrowing the neighbors.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
+            piece (int): The piece code of the final orientation.
 
         Returns:
-            bool: True if the position is the upper right corner, False otherwise.
+            int: The piece code, without any flag or domain bits.
         """
-        return row == 0 and col == self.num_cols - 1
-    
-    def is_corner_upper_left(self, row: int, col: int) -> bool:
+        piece &= CODE
+        cell = self.cells[row][col]
+
+        # Update the hash, replacing the previous rotation if the position was already explored
+        key_index = (row * self.num_cols + col) * 4
+        if cell & FIXED:
+            self.hash_key ^= self.zobrist_keys[key_index + ROTATION_INDEX[cell & CODE]]
+        else:
+            self.explored_count += 1
+        self.hash_key ^= self.zobrist_keys[key_index + ROTATION_INDEX[piece]]
+
+        # The domain of an explored cell holds only its final rotation
+        self.set_cell(row, col, piece | FIXED | 1 << ROTATION_INDEX[piece] + DOMAIN_SHIFT)
+
+        # A new piece starts a component, merged with the explored neighbors it connects to
+        if not cell & FIXED:
+            self.components.add(row * self.num_cols + col, CONNECTION_COUNTS[piece], self.trail)
+            self.link(row, col, piece)
+        return piece
+
+    def link(self, row: int, col: int, piece: int):
         """
-        Checks if the position is the upper left corner of the grid.
+        Merges the component of an explored piece with the explored neighbors that connect back to it.
+        A connection between two pieces of the same component closes a cycle, and a component left
+        with no open ends before covering the whole board is cut off from the rest: both mark the
+        board as invalid, as do more open ends than the connections still missing for a spanning tree.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
+            piece (int): The piece code of the final orientation.
+        """
+        index = row * self.num_cols + col
+        for direction, opposite, neighbor_row, neighbor_col in ((UP, DOWN, row - 1, col), (DOWN, UP, row + 1, col),
+                                                                 (LEFT, RIGHT, row, col - 1), (RIGHT, LEFT, row, col + 1)):
+            if not piece & direction or not (0 <= neighbor_row < self.num_rows and 0 <= neighbor_col < self.num_cols):
+                continue
+            neighbor = self.cells[neighbor_row][neighbor_col]
+            if neighbor & FIXED and neighbor & opposite:
+                if not self.components.union(index, neighbor_row * self.num_cols + neighbor_col, self.trail):
+                    self.invalid = True
+        if self.components.is_closed(index) and self.components.size(index) < self.board_size:
+            self.invalid = True
+
+        # Each open end becomes one of the missing connections, to a different unexplored piece
+        if self.components.open_ends > self.missing_connections:
+            self.invalid = True
+
+    def connect_components(self):
+        """
+        Rebuilds the components of the explored pieces from scratch, for a board rebuilt from a snapshot.
+        """
+        self.components = UnionFind(self.board_size, self.num_cols)
+        cells = self.cells
+        for row in range(self.num_rows):
+            for col in range(self.num_cols):
+                cell = cells[row][col]
+                if not cell & FIXED:
+                    continue
+
+                # Each connection is merged once, from the piece below or to the right of it
+                index = row * self.num_cols + col
+                self.components.add(index, CONNECTION_COUNTS[cell & CODE])
+                if row and cell & UP and cells[row - 1][col] & FIXED and cells[row - 1][col] & DOWN:
+                    if not self.components.union(index, index - self.num_cols):
+                        self.invalid = True
+                if col and cell & LEFT and cells[row][col - 1] & FIXED and cells[row][col - 1] & RIGHT:
+                    if not self.components.union(index, index - 1):
+                        self.invalid = True
+
+    def narrow(self, row: int, col: int, domains: list):
+        """
+        Intersects the domain of an unexplored cell with the domain allowed for its piece class.
+        An empty domain marks the board as invalid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            domains (list): The allowed domain for each piece class, already shifted into the domain bits.
+        """
+        cell = self.cells[row][col]
+        if cell & FIXED:
+            return
+        narrowed = cell & (domains[(cell & CODE) >> CLASS_SHIFT] | ~DOMAIN)
+        if narrowed == cell:
+            return
+        self.set_cell(row, col, narrowed)
+
+        # Queue the cell once it is left with a single rotation
+        domain = narrowed & DOMAIN
+        if not domain:
+            self.invalid = True
+        elif not domain & domain - 1:
+            self.pending.append((row, col))
+
+    def filter_windows(self) -> bool:
+        """
+        Narrows the domains of the unexplored cells with the pattern database of the 2x2 windows: each
+        cell keeps the rotations that take part in some consistent rotation tuple of every window around
+        it. A window with no consistent tuple left marks the board as invalid. The first call filters
+        every window, and the following ones only the windows around the cells written since.
 
         Returns:
-            bool: True if the position is the upper left corner, False otherwise.
+            bool: True if some domain was narrowed, False otherwise.
         """
-        return row == 0 and col == 0
-    
-    def is_corner_lower_right(self, row: int, col: int) -> bool:
+        table = pattern_table()
+        last = self.num_rows - 2
+
+        # Upper left corners of the windows to filter
+        if self.changed is None:
+            corners = [(row, col) for row in range(last + 1) for col in range(last + 1)]
+        else:
+            corners = {(corner_row, corner_col) for row, col in self.changed
+                       for corner_row in (row - 1, row) if 0 <= corner_row <= last
+                       for corner_col in (col - 1, col) if 0 <= corner_col <= last}
+        self.changed = []
+
+        changed = False
+        for row, col in corners:
+            positions = ((row, col), (row, col + 1), (row + 1, col), (row + 1, col + 1))
+            window = [self.cells[cell_row][cell_col] for cell_row, cell_col in positions]
+            if all(cell & FIXED for cell in window):
+                continue
+
+            # Look up the consistent tuples of the window, and keep the ones allowed by the domains
+            classes = 0
+            for i, cell in enumerate(window):
+                classes |= (cell & CODE) >> CLASS_SHIFT << 2 * i
+            context = (UP if row == 0 else 0) | (DOWN if row == last else 0) | (LEFT if col == 0 else 0) | (RIGHT if col == last else 0)
+            offset = (classes * 16 + context) * PATTERN_BYTES
+            allowed = int.from_bytes(table[offset:offset + PATTERN_BYTES], 'little')
+            for i, cell in enumerate(window):
+                allowed &= WINDOW_TUPLES[i][(cell & DOMAIN) >> DOMAIN_SHIFT]
+            if not allowed:
+                self.invalid = True
+                return changed
+
+            # Narrow each cell to the rotations left in some tuple
+            for i, cell in enumerate(window):
+                domain = 0
+                for k in range(4):
+                    if allowed & WINDOW_TUPLES[i][1 << k]:
+                        domain |= 1 << k
+                if domain << DOMAIN_SHIFT != cell & DOMAIN:
+                    self.narrow(*positions[i], [domain << DOMAIN_SHIFT] * 4)
+                    changed = True
+        return changed
+
+    def force_bridges(self) -> bool:
+        """
+        Reasons about the graph of the connections that may still be open. Since a solution is a spanning
+        tree, this graph must be connected, each of its bridges must be open, and a connection between
+        two cells already linked by connections that are surely open would close a cycle, so it must be
+        closed. The bridges are found with an iterative Tarjan search, in time linear in the size of the board.
+
+        Returns:
+            bool: True if some domain was narrowed, False otherwise.
+        """
+        cells = self.cells
+        num_rows = self.num_rows
+        num_cols = self.num_cols
+
+        # Start from the components of the explored pieces, which only change through unexplored cells,
+        # and merge the unexplored cells linked to them or to each other by connections that are surely open
+        linked = self.components.copy()
+        groups = linked.count
+        uncertain = []
+        for row in range(num_rows):
+            for col in range(num_cols):
+                cell = cells[row][col]
+                if cell & FIXED:
+                    continue
+                groups += 1
+                piece_class = (cell & CODE) >> CLASS_SHIFT
+                domain = (cell & DOMAIN) >> DOMAIN_SHIFT
+                always = ALWAYS_CONNECTIONS[piece_class][domain]
+                possible = ANY_CONNECTIONS[piece_class][domain]
+                index = row * num_cols + col
+                for direction, opposite, neighbor_row, neighbor_col in ((UP, DOWN, row - 1, col), (DOWN, UP, row + 1, col),
+                                                                         (LEFT, RIGHT, row, col - 1), (RIGHT, LEFT, row, col + 1)):
+                    if not possible & direction or not (0 <= neighbor_row < num_rows and 0 <= neighbor_col < num_cols):
+                        continue
+                    neighbor = cells[neighbor_row][neighbor_col]
+                    neighbor_index = neighbor_row * num_cols + neighbor_col
+                    if neighbor & FIXED:
+                        if not neighbor & opposite:
+                            continue
+                    elif direction in (UP, LEFT):
+                        # Each connection between unexplored cells is seen once, from the cell above or to its left
+                        continue
+                    else:
+                        neighbor_domain = (neighbor & DOMAIN) >> DOMAIN_SHIFT
+                        neighbor_class = (neighbor & CODE) >> CLASS_SHIFT
+                        if not ANY_CONNECTIONS[neighbor_class][neighbor_domain] & opposite:
+                            continue
+                        if not (always & direction or ALWAYS_CONNECTIONS[neighbor_class][neighbor_domain] & opposite):
+                            uncertain.append((index, neighbor_index, direction))
+                            continue
+                    if not linked.union(index, neighbor_index):
+                        self.invalid = True
+                        return False
+                    groups -= 1
+
+        # An uncertain connection inside a group would close a cycle, so it must be closed; the others
+        # link the groups in a multigraph, where each group is represented by its root
+        changed = False
+        links = []
+        adjacency = {}
+        for index, neighbor, direction in uncertain:
+            first, second = linked.find(index), linked.find(neighbor)
+            if first == second:
+                self.narrow_link(index, neighbor, direction, False)
+                changed = True
+                continue
+            adjacency.setdefault(first, []).append((second, len(links)))
+            adjacency.setdefault(second, []).append((first, len(links)))
+            links.append((index, neighbor, direction))
+
+        # Find the bridges of the multigraph with a single depth-first search, checking that it reaches every group
+        root = linked.find(0)
+        order = {root: 0}
+        lowest = {root: 0}
+        path = [(root, -1, 0)]
+        while path:
+            group, parent_link, position = path[-1]
+            neighbors = adjacency.get(group, ())
+            if position < len(neighbors):
+                path[-1] = (group, parent_link, position + 1)
+                neighbor, link = neighbors[position]
+                if link == parent_link:
+                    continue
+                if neighbor not in order:
+                    order[neighbor] = lowest[neighbor] = len(order)
+                    path.append((neighbor, link, 0))
+                else:
+                    lowest[group] = min(lowest[group], order[neighbor])
+                continue
+            path.pop()
+            if path:
+                parent = path[-1][0]
+                lowest[parent] = min(lowest[parent], lowest[group])
+
+                # Open the bridges, the only way to link a part of the board to the rest
+                if lowest[group] > order[parent]:
+                    self.narrow_link(*links[parent_link], True)
+                    changed = True
+        if len(order) != groups:
+            self.invalid = True
+        return changed
+
+    def narrow_link(self, index: int, neighbor: int, direction: int, connected: bool):
+        """
+        Narrows two neighbor cells to the rotations that connect them, or to the ones that do not.
+
+        Args:
+            index (int): The flat index of the first cell.
+            neighbor (int): The flat index of the neighbor, DOWN or RIGHT of the first cell.
+            direction (int): The direction from the first cell to the neighbor, DOWN or RIGHT.
+            connected (bool): Whether the cells must connect.
+        """
+        opposite = UP if direction == DOWN else LEFT
+        self.narrow(*divmod(index, self.num_cols), FIXED_NEIGHBOR_DOMAINS[direction][connected])
+        self.narrow(*divmod(neighbor, self.num_cols), FIXED_NEIGHBOR_DOMAINS[opposite][connected])
+
+    def removed_options(self, row: int, col: int, piece: int) -> int:
+        """
+        Counts the rotations that placing a piece would remove from the domains of its unexplored neighbors.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            piece (int): The piece code of the rotation to place.
+
+        Returns:
+            int: The number of rotations removed, summed over the neighbors.
+        """
+        removed = 0
+        for direction, opposite, neighbor_row, neighbor_col in ((UP, DOWN, row - 1, col), (DOWN, UP, row + 1, col),
+                                                                 (LEFT, RIGHT, row, col - 1), (RIGHT, LEFT, row, col + 1)):
+            # Skip the directions that lead outside the grid, and the neighbors already explored
+            if not (0 <= neighbor_row < self.num_rows and 0 <= neighbor_col < self.num_cols):
+                continue
+            neighbor = self.cells[neighbor_row][neighbor_col]
+            if neighbor & FIXED:
+                continue
+            allowed = FIXED_NEIGHBOR_DOMAINS[opposite][bool(piece & direction)][(neighbor & CODE) >> CLASS_SHIFT]
+            removed += bin(neighbor & DOMAIN & ~allowed).count('1')
+        return removed
+
+    def propagate(self):
+        """
+        Fixes the pieces queued with a single rotation left. Fixing a piece narrows the domains of its
+        four neighbors, which queues the ones left with a single rotation in turn, until no piece is
+        forced or the board becomes invalid.
+        """
+        cells = self.cells
+        pending = self.pending
+        while pending and not self.invalid:
+            row, col = pending.pop()
+            cell = cells[row][col]
+            if not cell & FIXED:
+                domain = (cell & DOMAIN) >> DOMAIN_SHIFT
+                self.fix(row, col, ROTATIONS[(cell & CODE) >> CLASS_SHIFT][domain.bit_length() - 1])
+        pending.clear()
+
+    def set_cell(self, row: int, col: int, cell: int):
+        """
+        Writes a cell, copying its row first if it is shared with another board and
+        recording the previous value in the trail.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            cell (int): The new value of the cell.
+        """
+        cells_row = self.cells[row]
+
+        # Copy a shared row before writing to it
+        if not self.owned_rows[row]:
+            cells_row = self.cells[row] = cells_row[:]
+            self.owned_rows[row] = True
+
+        # Record the previous value to be able to undo the change
+        previous = cells_row[col]
+        if self.trail is not None:
+            self.trail.append((row, col, previous))
+        cells_row[col] = cell
+        if self.changed is not None:
+            self.changed.append((row, col))
+
+        if self.buckets is not None:
+            self.move_bucket(row, col, previous ^ cell)
+
+    def move_bucket(self, row: int, col: int, changed: int):
+        """
+        Moves a written cell to the bucket of its new domain, and its neighbors too if it was explored
+        or unexplored by the write.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            changed (int): The bits of the cell changed by the write.
+        """
+        self.buckets.update((row, col), self.bucket_key(row, col))
+        if changed & FIXED:
+            for neighbor_row, neighbor_col in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= neighbor_row < self.num_rows and 0 <= neighbor_col < self.num_cols:
+                    self.buckets.update((neighbor_row, neighbor_col), self.bucket_key(neighbor_row, neighbor_col))
+
+    def bucket_key(self, row: int, col: int):
         """
-        Checks if the position is the lower right corner of the grid.
+        Computes the bucket of a cell: the smaller its domain, and then the more explored neighbors
+        it has, the earlier the bucket.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
 
         Returns:
-            bool: True if the position is the lower right corner, False otherwise.
+            int: The bucket of the cell, or None if the cell is explored or has a single valid rotation.
         """
-        return row == self.num_rows - 1 and col == self.num_cols - 1
+        cell = self.cells[row][col]
+        size = bin(cell & DOMAIN).count('1')
+        if cell & FIXED or size < 2:
+            return None
+        explored = 0
+        for neighbor_row, neighbor_col in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+            if 0 <= neighbor_row < self.num_rows and 0 <= neighbor_col < self.num_cols and self.cells[neighbor_row][neighbor_col] & FIXED:
+                explored += 1
+        return (size - 2) * 5 + 4 - explored
+
+    def track_domains(self):
+        """
+        Puts every unexplored cell in its bucket, and keeps the buckets up to date from then on.
+        """
+        self.buckets = DomainBuckets(self.num_rows, self.num_cols)
+        for row in range(self.num_rows):
+            for col in range(self.num_cols):
+                self.buckets.update((row, col), self.bucket_key(row, col))
+
+    # Rotation Functions
     
-    def is_corner_lower_left(self, row: int, col: int) -> bool:
+    def neighbor_masks(self, row: int, col: int) -> tuple:
         """
-        Checks if the position is the lower left corner of the grid.
+        Describes the neighbors of a position as direction masks.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
 
         Returns:
-            bool: True if the position is the lower left corner, False otherwise.
+            tuple: The directions of the neighbors in their final position that connect back to the position,
+                the directions of the neighbors in their final position that do not, and the directions
+                of the neighbors that are F pieces.
+        """
+        cells = self.cells
+        connected = 0
+        disconnected = 0
+        locking = 0
+        for direction, opposite, neighbor_row, neighbor_col in ((UP, DOWN, row - 1, col), (DOWN, UP, row + 1, col),
+                                                                 (LEFT, RIGHT, row, col - 1), (RIGHT, LEFT, row, col + 1)):
+            # Skip the directions that lead outside the grid
+            if not (0 <= neighbor_row < self.num_rows and 0 <= neighbor_col < self.num_cols):
+                continue
+            neighbor = cells[neighbor_row][neighbor_col]
+            if neighbor & FIXED:
+                if neighbor & opposite:
+                    connected |= direction
+                else:
+                    disconnected |= direction
+            if (neighbor & CODE) >> CLASS_SHIFT == LOCKING:
+                locking |= direction
+        return connected, disconnected, locking
+
+    def get_valid_rotations(self, piece: int, row: int, col: int) -> list:
+        """
+        Returns valid rotations for a piece considering both its position and neighboring pieces,
+        as kept in the domain of its cell.
+
+        Args:
+            piece (int): The piece code.
+            row (int): The row index of the piece on the grid.
+            col (int): The column index of the piece on the grid.
+
+        Returns:
+            list: A list of valid rotations for the piece at the specified position.
+        """
+        cell = self.cells[row][col]
+
+        # Check if the piece is already in the correct position
+        if cell & FIXED:
+            # If so, return an empty list
+            return []
+
+        return [(rotation, row, col) for rotation in DOMAIN_NAMES[(cell & CODE) >> CLASS_SHIFT][(cell & DOMAIN) >> DOMAIN_SHIFT]]
+
+    def compute_domain(self, piece: int, row: int, col: int) -> int:
+        """
+        Computes from scratch the domain of a piece considering its position, the neighbors that are
+        already in their final position and the F pieces in the neighbors, with one lookup per rule table.
+
+        Args:
+            piece (int): The piece code.
+            row (int): The row index of the piece on the grid.
+            col (int): The column index of the piece on the grid.
+
+        Returns:
+            int: The bitset with bit k set for each valid k-th rotation of the class of the piece.
         """
-        return row == self.num_rows - 1 and col == 0
+        piece_class = (piece & CODE) >> CLASS_SHIFT
+        connected, disconnected, locking = self.neighbor_masks(row, col)
+        forbidden = disconnected | self.positions[row][col]
+        return (CONNECTION_DOMAINS[connected][forbidden][piece_class] & LOCKING_DOMAINS[locking][piece_class]) >> DOMAIN_SHIFT
+
+    @classmethod
+    def parse_instance(cls):
+        """
+        Parses an input string representing the problem instance and returns a Board instance.
+
+        Returns:
+            Board: An instance of the Board class representing the parsed grid.
+        """
+        grid = []
+        input_str = sys.stdin.read().strip()  # Read the entire input
     
-    def is_edge_upper(self, row: int, col: int) -> bool:
+        lines = input_str.split('\n')  # Split by newline characters
+        for line in lines:
+            pieces = line.split()  # Split by whitespaces
+            grid.append(pieces)
+
+        # Create a Board instance with the parsed grid
+        return cls(grid)
+
+# The rule tables, for the vectorized board
+CONNECTION_DOMAINS_ARRAY = (np.array(CONNECTION_DOMAINS) >> DOMAIN_SHIFT).astype(np.uint8)
+LOCKING_DOMAINS_ARRAY = (np.array(LOCKING_DOMAINS) >> DOMAIN_SHIFT).astype(np.uint8)
+POSITION_DOMAINS_ARRAY = (np.array(POSITION_DOMAINS) >> DOMAIN_SHIFT).astype(np.uint8)
+ALWAYS_CONNECTIONS_ARRAY = np.array([ALWAYS_CONNECTIONS[piece_class] for piece_class in range(4)], dtype=np.uint8)
+ANY_CONNECTIONS_ARRAY = np.array([ANY_CONNECTIONS[piece_class] for piece_class in range(4)], dtype=np.uint8)
+
+# Piece code of each rotation, per class (0 past the last rotation), and the rotation of each singleton domain
+ROTATIONS_ARRAY = np.array([ROTATIONS[piece_class] + [0] * (4 - len(ROTATIONS[piece_class])) for piece_class in range(4)],
+                           dtype=np.uint8)
+SINGLETON_ROTATIONS = np.array([max(domain.bit_length() - 1, 0) for domain in range(16)], dtype=np.uint8)
+
+# Static neighbor arrays of the vectorized board, per number of rows
+NEIGHBOR_ARRAYS = {}
+
+# Cell indices of each grid in each static order, per order name and number of rows
+CELL_ORDER_INDICES = {}
+
+class NumpyBoard(Board):
+    """
+    Board backend that keeps the cells in flat uint8 arrays, so that neighbor
+    queries are answered for every cell at once instead of one get_value at a time.
+    The domains are kept in an array of their own, narrowed by whole-board sweeps.
+    """
+
+    __slots__ = ('codes', 'fixed', 'domains', 'neighbors', 'inside', 'outside', 'position_domains')
+
+    vectorized = True
+
+    def __init__(self, grid):
+
+        """
+        Initializes a NumpyBoard object.
+
+        Args:
+            grid (list): The grid layout representing the board.
+        """
+
+        size = len(grid)
+
+        # Piece codes and fixed flags, with one extra padding cell that stands for the outside of the grid
+        self.codes = np.zeros(size * size + 1, dtype=np.uint8)
+        self.codes[:-1] = [PIECE_CODES[piece] for row in grid for piece in row]
+        self.fixed = np.zeros(size * size + 1, dtype=np.uint8)
+
+        # Static neighbor arrays, shared by every copy of the board
+        self.neighbors, self.inside, self.outside = NumpyBoard.neighbor_arrays(size)
+
+        # Rotations allowed by the limits of the grid, shared by every copy of the board
+        self.position_domains = POSITION_DOMAINS_ARRAY[self.outside, self.codes[:-1] >> CLASS_SHIFT]
+
+        self.invalid = False
+        self.pending = []
+        self.cursor = 0
+        self.action_count = 0
+        self.board_size = size * size
+        self.explored_count = 0
+        self.num_rows = size
+        self.num_cols = size
+        self.last_action = None
+        self.trail = None
+        self.zobrist_keys = zobrist_keys(self.board_size)
+        self.hash_key = 0
+        self.components = None
+        self.buckets = None
+
+        # Domains of the cells, seeded from the static rules of the puzzle
+        self.domains = np.zeros(size * size + 1, dtype=np.uint8)
+        self.domains[:-1] = self.valid_rotation_domains()
+        if not self.domains[:-1].all():
+            self.invalid = True
+
+        # A solution is a spanning tree, with one connection less than its cells, each joining two pieces
+        if int(BIT_COUNTS[self.codes[:-1] & CONNECTIONS].sum()) != 2 * (self.board_size - 1):
+            self.invalid = True
+
+    @staticmethod
+    def neighbor_arrays(size: int):
+        """
+        Precomputes the neighbor-index arrays of a square grid.
+
+        Args:
+            size (int): The number of rows (and columns) of the grid.
+
+        Returns:
+            tuple: The neighbor index of each cell per direction (the padding cell when outside the grid),
+                whether that neighbor is inside the grid, and the directions of each cell that point outside
+                the grid.
+        """
+        if size in NEIGHBOR_ARRAYS:
+            return NEIGHBOR_ARRAYS[size]
+
+        rows, cols = np.divmod(np.arange(size * size), size)
+        outside_index = size * size
+
+        neighbors = {}
+        inside = {}
+        outside = np.zeros(size * size, dtype=np.uint8)
+        for direction, row_step, col_step in ((UP, -1, 0), (DOWN, 1, 0), (LEFT, 0, -1), (RIGHT, 0, 1)):
+            neighbor_rows, neighbor_cols = rows + row_step, cols + col_step
+            inside[direction] = (neighbor_rows >= 0) & (neighbor_rows < size) & (neighbor_cols >= 0) & (neighbor_cols < size)
+            neighbors[direction] = np.where(inside[direction], neighbor_rows * size + neighbor_cols, outside_index)
+            outside[~inside[direction]] |= direction
+
+        NEIGHBOR_ARRAYS[size] = neighbors, inside, outside
+        return NEIGHBOR_ARRAYS[size]
+
+    @property
+    def cells(self) -> list:
+        """
+        Snapshot of the cells as a list of rows, in the same format as Board.cells.
+        """
+        cells = (self.codes[:-1].astype(np.int64) | self.fixed[:-1].astype(np.int64) * FIXED
+                 | self.domains[:-1].astype(np.int64) << DOMAIN_SHIFT)
+        return cells.reshape(self.num_rows, self.num_cols).tolist()
+
+    @property
+    def grid(self) -> list:
+        """
+        Grid layout of the board in the text format.
+        """
+        return [[PIECE_NAMES[code] for code in row] for row in self.codes[:-1].reshape(self.num_rows, self.num_cols).tolist()]
+
+    @property
+    def explored_grid(self) -> list:
+        """
+        Grid of the pieces already in their final position, with ' ' for the positions still to explore.
+        """
+        return [[PIECE_NAMES[cell & CODE] if cell & FIXED else ' ' for cell in row] for row in self.cells]
+
+    def copy(self):
+        """
+        Creates a copy of the board arrays, to be modified by a new state.
+
+        Returns:
+            NumpyBoard: A new board with the same cells and explored positions.
+        """
+        new_board = NumpyBoard.__new__(NumpyBoard)
+        new_board.codes = self.codes.copy()
+        new_board.fixed = self.fixed.copy()
+        new_board.domains = self.domains.copy()
+        new_board.neighbors = self.neighbors
+        new_board.inside = self.inside
+        new_board.outside = self.outside
+        new_board.position_domains = self.position_domains
+        new_board.invalid = False
+        new_board.pending = []
+        new_board.cursor = self.cursor
+        new_board.action_count = self.action_count
+        new_board.board_size = self.board_size
+        new_board.explored_count = self.explored_count
+        new_board.num_rows = self.num_rows
+        new_board.num_cols = self.num_cols
+        new_board.last_action = self.last_action
+        new_board.trail = None
+        new_board.zobrist_keys = self.zobrist_keys
+        new_board.hash_key = self.hash_key
+        new_board.components = None
+        new_board.buckets = None
+        return new_board
+
+    def same_cells(self, other) -> bool:
+        """
+        Compares the cells of two boards of the same instance.
+
+        Args:
+            other (NumpyBoard): The other board.
+
+        Returns:
+            bool: True if every cell is equal, False otherwise.
+        """
+        return np.array_equal(self.codes, other.codes) and np.array_equal(self.fixed, other.fixed)
+
+    def pack(self):
+        """
+        Creates a compact snapshot of the board, with one byte per cell.
+
+        Returns:
+            BoardSnapshot: The snapshot, to be unpacked back into a board when needed.
+        """
+        return BoardSnapshot(self, PACKED_CELLS_ARRAY[self.codes[:-1] | self.fixed[:-1].astype(np.uint16) * FIXED
+                                                     | self.domains[:-1].astype(np.uint16) << DOMAIN_SHIFT].tobytes())
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Rebuilds a board from a snapshot created by pack.
+
+        Args:
+            snapshot (BoardSnapshot): The snapshot of the board.
+
+        Returns:
+            NumpyBoard: A new board with the cells and counters of the snapshot.
+        """
+        board = cls.__new__(cls)
+        cells = UNPACKED_CELLS_ARRAY[np.frombuffer(snapshot.data, dtype=np.uint8)]
+        board.codes = np.zeros(len(cells) + 1, dtype=np.uint8)
+        board.codes[:-1] = cells & CODE
+        board.fixed = np.zeros(len(cells) + 1, dtype=np.uint8)
+        board.fixed[:-1] = cells & FIXED != 0
+        board.domains = np.zeros(len(cells) + 1, dtype=np.uint8)
+        board.domains[:-1] = cells >> DOMAIN_SHIFT
+        board.neighbors, board.inside, board.outside = NumpyBoard.neighbor_arrays(snapshot.num_cols)
+        board.position_domains = POSITION_DOMAINS_ARRAY[board.outside, board.codes[:-1] >> CLASS_SHIFT]
+        snapshot.restore(board)
+        return board
+
+    def unwind(self, position: int):
+        """
+        Restores the cells recorded in the trail after the given position. Single cells are recorded
+        by their index, and sweeps of the whole board by a copy of the arrays (with index None).
+
+        Args:
+            position (int): The length of the trail to go back to.
+        """
+        trail = self.trail
+        while len(trail) > position:
+            index, code, fixed, domain = trail.pop()
+            if index is None:
+                self.codes, self.fixed, self.domains = code, fixed, domain
+            else:
+                self.codes[index] = code
+                self.fixed[index] = fixed
+                self.domains[index] = domain
+
+    def print(self):
+        """
+        Prints the grid layout.
+
+        """
+        for row in self.grid:
+            print('\t'.join(row))
+
+    def get_value(self, row: int, col: int) -> str:
+        """
+        Gets the value (piece identifier) at the given position in the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            str: The piece identifier at the specified position.
+        """
+        return PIECE_NAMES[int(self.codes[row * self.num_cols + col])]
+
+    def is_explored(self, row: int, col: int) -> bool:
+        """
+        Checks if the piece at the given position is already in its final orientation.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is explored, False otherwise.
+        """
+        return bool(self.fixed[row * self.num_cols + col])
+
+    def fix(self, row: int, col: int, piece: int):
+        """
+        Places a piece in its final orientation at the given position.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+            piece (int): The piece code of the final orientation.
+        """
+        piece &= CODE
+        index = row * self.num_cols + col
+
+        # Update the hash, replacing the previous rotation if the position was already explored
+        if self.fixed[index]:
+            self.hash_key ^= self.zobrist_keys[index * 4 + ROTATION_INDEX[int(self.codes[index])]]
+        else:
+            self.explored_count += 1
+        self.hash_key ^= self.zobrist_keys[index * 4 + ROTATION_INDEX[piece]]
+
+        # Record the previous value to be able to undo the change
+        if self.trail is not None:
+            self.trail.append((index, self.codes[index], self.fixed[index], self.domains[index]))
+        self.codes[index] = piece
+        self.fixed[index] = 1
+        self.domains[index] = 1 << ROTATION_INDEX[piece]
+
+    def propagate(self):
+        """
+        Narrows the domains of the whole board until a fixpoint. Each sweep shifts the connections
+        that every rotation of a neighbor has, and the ones that none of them has, into the cells
+        next to it, and intersects the domains with the rotations that agree with them. Afterwards,
+        the pieces left with a single valid rotation are placed. Marks the board as invalid if
+        a domain becomes empty.
+        """
+        size = self.num_rows
+        classes = (self.codes[:-1] >> CLASS_SHIFT).reshape(size, size)
+
+        # Record the arrays to be able to undo the sweep
+        if self.trail is not None:
+            self.trail.append((None, self.codes, self.fixed, self.domains))
+            self.codes, self.fixed, self.domains = self.codes.copy(), self.fixed.copy(), self.domains.copy()
+        domains = self.domains[:-1].reshape(size, size)
+
+        while True:
+            always = ALWAYS_CONNECTIONS_ARRAY[classes, domains]
+            never = ~ANY_CONNECTIONS_ARRAY[classes, domains]
+
+            # Directions the piece must connect to and must not connect to, from each side
+            must = np.zeros((size, size), dtype=np.uint8)
+            must_not = np.zeros((size, size), dtype=np.uint8)
+            must[1:, :] |= (always[:-1, :] & DOWN) >> 1
+            must_not[1:, :] |= (never[:-1, :] & DOWN) >> 1
+            must[:-1, :] |= (always[1:, :] & UP) << 1
+            must_not[:-1, :] |= (never[1:, :] & UP) << 1
+            must[:, 1:] |= (always[:, :-1] & RIGHT) >> 1
+            must_not[:, 1:] |= (never[:, :-1] & RIGHT) >> 1
+            must[:, :-1] |= (always[:, 1:] & LEFT) << 1
+            must_not[:, :-1] |= (never[:, 1:] & LEFT) << 1
+
+            narrowed = domains & CONNECTION_DOMAINS_ARRAY[must, must_not, classes]
+            if not narrowed.all():
+                self.invalid = True
+                return
+            if np.array_equal(narrowed, domains):
+                break
+            domains[...] = narrowed
+
+        # Place the pieces left with a single valid rotation
+        domains = self.domains[:-1]
+        forced = np.flatnonzero((self.fixed[:-1] == 0) & (BIT_COUNTS[domains] == 1))
+        if not forced.size:
+            return
+        rotations = SINGLETON_ROTATIONS[domains[forced]]
+        self.codes[forced] = ROTATIONS_ARRAY[self.codes[forced] >> CLASS_SHIFT, rotations]
+        self.fixed[forced] = 1
+        self.explored_count += forced.size
+        for index, k in zip(forced.tolist(), rotations.tolist()):
+            self.hash_key ^= self.zobrist_keys[index * 4 + k]
+
+    # Whole Board Neighbor Queries
+
+    def fixed_neighbor(self, direction: int):
+        """
+        Finds the cells whose neighbor in the given direction is already in its final orientation.
+
+        Args:
+            direction (int): The direction of the neighbor (UP, DOWN, LEFT or RIGHT).
+
+        Returns:
+            numpy.ndarray: A boolean array with one entry per cell.
+        """
+        return self.fixed[self.neighbors[direction]] != 0
+
+    def neighbor_connects(self, direction: int, opposite: int):
+        """
+        Finds the cells whose neighbor in the given direction connects back to them.
+
+        Args:
+            direction (int): The direction of the neighbor (UP, DOWN, LEFT or RIGHT).
+            opposite (int): The direction that points from the neighbor back to the cell.
+
+        Returns:
+            numpy.ndarray: A boolean array with one entry per cell.
+        """
+        return (self.codes[self.neighbors[direction]] & opposite) != 0
+
+    def border_connections(self):
+        """
+        Finds the cells that have an outgoing connection into the border of the grid.
+
+        Returns:
+            numpy.ndarray: A boolean array with one entry per cell.
+        """
+        return (self.codes[:-1] & self.outside) != 0
+
+    def conflicts(self):
+        """
+        Finds the explored cells that disagree with an explored neighbor about the connection between them.
+
+        Returns:
+            numpy.ndarray: A boolean array with one entry per cell.
+        """
+        codes = self.codes[:-1]
+        fixed = self.fixed[:-1] != 0
+        conflicts = np.zeros(self.board_size, dtype=bool)
+        for direction, opposite in NEIGHBOR_DIRECTIONS:
+            connects = (codes & direction) != 0
+            conflicts |= fixed & self.fixed_neighbor(direction) & (connects != self.neighbor_connects(direction, opposite))
+        return conflicts
+
+    def valid_rotation_domains(self):
+        """
+        Computes the valid rotations of every unexplored cell, considering the limits of the grid,
+        the neighbors already in their final position and the F pieces in the neighbors.
+
+        Returns:
+            numpy.ndarray: One bitset per cell, where bit k marks the k-th rotation of ROTATIONS as valid
+                (0 for explored cells).
+        """
+        codes = self.codes[:-1]
+        classes = codes >> CLASS_SHIFT
+
+        # Directions the piece must connect to, must not connect to, and that lead to F pieces
+        must = np.zeros(self.board_size, dtype=np.uint8)
+        must_not = np.zeros(self.board_size, dtype=np.uint8)
+        locking = np.zeros(self.board_size, dtype=np.uint8)
+        for direction, opposite in NEIGHBOR_DIRECTIONS:
+            fixed = self.fixed_neighbor(direction)
+            connects = self.neighbor_connects(direction, opposite)
+            must[fixed & connects] |= direction
+            must_not[fixed & ~connects] |= direction
+            locking[self.inside[direction] & (self.codes[self.neighbors[direction]] >> CLASS_SHIFT == LOCKING)] |= direction
+
+        # One lookup per rule table for every cell
+        domains = (self.position_domains & CONNECTION_DOMAINS_ARRAY[must, must_not, classes]
+                   & LOCKING_DOMAINS_ARRAY[locking, classes])
+        domains[self.fixed[:-1] != 0] = 0
+        return domains
+
+    def rotation_actions(self, index: int, domain: int) -> list:
+        """
+        Returns the actions that place a cell in each rotation of its domain.
+
+        Args:
+            index (int): The flat index of the cell.
+            domain (int): The bitset of valid rotations of the cell.
+
+        Returns:
+            list: A list of (piece, row, col) actions.
+        """
+        row, col = divmod(int(index), self.num_cols)
+        rotations = ROTATIONS[int(self.codes[index]) >> CLASS_SHIFT]
+        return [(PIECE_NAMES[rotations[k]], row, col) for k in range(len(rotations)) if domain >> k & 1]
+
+    def branch_rotations(self, order: str) -> list:
+        """
+        Returns the rotations to branch on: the valid rotations of the first unexplored cell in a static order.
+
+        Args:
+            order (str): The name of the order in STATIC_ORDERS.
+
+        Returns:
+            list: A list of (piece, row, col) actions, empty if every cell is explored.
+        """
+        key = (order, self.num_rows)
+        if key not in CELL_ORDER_INDICES:
+            CELL_ORDER_INDICES[key] = np.array([row * self.num_cols + col for row, col in cell_order(*key)], dtype=np.intp)
+        indices = CELL_ORDER_INDICES[key]
+        unexplored = self.fixed[:-1] == 0
+        pending = indices[unexplored[indices]]
+        if not pending.size:
+            return []
+        return self.rotation_actions(pending[0], self.domains[pending[0]])
+
+    def is_solved(self) -> bool:
+        """
+        Checks if a fully explored board is a solution: no connection leads into the border or to
+        a neighbor that does not connect back, there are exactly enough connections for a tree,
+        and every cell is reached from the upper left corner.
+
+        Returns:
+            bool: True if the board is a solution, False otherwise.
+        """
+        connections = int(BIT_COUNTS[self.codes[:-1] & CONNECTIONS].sum())
+        return not (self.border_connections().any() or self.conflicts().any()
+                    or connections != 2 * (self.board_size - 1) or not self.is_connected())
+
+    def is_connected(self) -> bool:
+        """
+        Checks if the connections of the board link every cell, starting from the upper left corner.
+
+        Returns:
+            bool: True if every cell is reached, False otherwise.
+        """
+        codes = self.codes.tolist()
+        neighbors = [(direction, self.neighbors[direction].tolist()) for direction in (UP, DOWN, LEFT, RIGHT)]
+        visited = [False] * self.board_size
+        visited[0] = True
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            for direction, neighbor in neighbors:
+                if codes[index] & direction and not visited[neighbor[index]]:
+                    visited[neighbor[index]] = True
+                    stack.append(neighbor[index])
+        return all(visited)
+
+class EdgeBoard(Board):
+    """
+    Board backend that also models every edge between two neighbor cells as a variable, open, closed
+    or unknown. Each cell links its four edges: the edges narrow its domain, and its domain opens the
+    edges that every remaining rotation connects to and closes the ones that none does. Propagation
+    queues a cell whenever one of its edges changes, so connections are inferred before either of the
+    two neighbors is in its final position.
+    """
+
+    __slots__ = ('edges', 'cell_edges')
+
+    def __init__(self, grid):
+
+        """
+        Initializes an EdgeBoard object.
+
+        Args:
+            grid (list): The grid layout representing the board.
+        """
+        super().__init__(grid)
+
+        # Edges of the board, and the edges of each cell, shared by every copy of the board
+        self.cell_edges, edges = edge_layout(self.num_rows)
+        self.edges = edges[:]
+
+        # Every cell is checked against its edges once
+        self.pending = [(row, col) for row in range(self.num_rows) for col in range(self.num_cols)]
+
+    def copy(self):
+        """
+        Creates a copy of the board, to be modified by a new state.
+
+        Returns:
+            EdgeBoard: A new board with the same cells, edges and explored positions.
+        """
+        new_board = super().copy()
+        new_board.edges = self.edges[:]
+        new_board.cell_edges = self.cell_edges
+        return new_board
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Rebuilds a board from a snapshot created by pack, deriving the edges from the domains.
+
+        Args:
+            snapshot (BoardSnapshot): The snapshot of the board.
+
+        Returns:
+            EdgeBoard: A new board with the cells and counters of the snapshot.
+        """
+        board = super().from_snapshot(snapshot)
+        board.cell_edges, edges = edge_layout(board.num_rows)
+        board.edges = edges[:]
+        for row in range(board.num_rows):
+            for col in range(board.num_cols):
+                cell = board.cells[row][col]
+                piece_class, domain = (cell & CODE) >> CLASS_SHIFT, (cell & DOMAIN) >> DOMAIN_SHIFT
+                for direction, edge, _, _ in board.cell_edges[row * board.num_cols + col]:
+                    if ALWAYS_CONNECTIONS[piece_class][domain] & direction:
+                        board.edges[edge] = EDGE_OPEN
+                    elif not ANY_CONNECTIONS[piece_class][domain] & direction:
+                        board.edges[edge] = EDGE_CLOSED
+        return board
+
+    def unwind(self, position: int):
+        """
+        Restores the cells, sets and edges recorded in the trail after the given position.
+
+        Args:
+            position (int): The length of the trail to go back to.
+        """
+        trail = self.trail
+        cells = self.cells
+        while len(trail) > position:
+            row, col, value = trail.pop()
+            if row is None:
+                self.edges[col] = value
+            elif row == SETS_ENTRY:
+                self.components.restore(col, value)
+            else:
+                changed = cells[row][col] ^ value
+                cells[row][col] = value
+                if self.buckets is not None:
+                    self.move_bucket(row, col, changed)
+
+    def fix(self, row: int, col: int, piece: int):
         """
-        Checks if the position is on the upper edge of the grid.
+        Places a piece in its final orientation at the given position, and queues it so that
+        propagate sets its edges.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
-
-        Returns:
-            bool: True if the position is on the upper edge, False otherwise.
+            piece (int): The piece code of the final orientation.
         """
-        return row == 0
-    
-    def is_edge_lower(self, row: int, col: int) -> bool:
+        self.place(row, col, piece)
+        self.pending.append((row, col))
+
+    def narrow(self, row: int, col: int, domains: list):
         """
-        Checks if the position is on the lower edge of the grid.
+        Intersects the domain of an unexplored cell with the domain allowed for its piece class, and
+        queues the cell so that propagate revises its edges if the domain changed.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
-
-        Returns:
-            bool: True if the position is on the lower edge, False otherwise.
+            domains (list): The allowed domain for each piece class, already shifted into the domain bits.
         """
-        return row == self.num_rows - 1
-    
-    def is_edge_left(self, row: int, col: int) -> bool:
+        cell = self.cells[row][col]
+        super().narrow(row, col, domains)
+        if self.cells[row][col] != cell:
+            self.pending.append((row, col))
+
+    def set_edge(self, edge: int, state: int):
         """
-        Checks if the position is on the left edge of the grid.
+        Writes an edge, recording the previous value in the trail.
 
         Args:
-            row (int): The row index of the position.
-            col (int): The column index of the position.
+            edge (int): The index of the edge.
+            state (int): The new state of the edge.
+        """
+        if self.trail is not None:
+            self.trail.append((None, edge, self.edges[edge]))
+        self.edges[edge] = state
 
-        Returns:
-            bool: True if the position is on the left edge, False otherwise.
+    def propagate(self):
         """
-        return col == 0
-    
-    def is_edge_right(self, row: int, col: int) -> bool:
+        Revises the queued cells against their edges until no edge changes, fixing the pieces left
+        with a single rotation, or until the board becomes invalid.
+        """
+        pending = self.pending
+        while pending and not self.invalid:
+            row, col = pending.pop()
+            self.revise(row, col)
+        pending.clear()
+
+    def revise(self, row: int, col: int):
         """
-        Checks if the position is on the right edge of the grid.
+        Narrows the domain of a cell to the rotations that agree with its known edges, then sets the
+        unknown edges that the remaining rotations agree on and queues the neighbors behind them.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
-
-        Returns:
-            bool: True if the position is on the right edge, False otherwise.
         """
-        return col == self.num_cols - 1          
+        edges = self.edges
+        cell = self.cells[row][col]
+        piece_class = (cell & CODE) >> CLASS_SHIFT
+        cell_edges = self.cell_edges[row * self.num_cols + col]
+
+        # Narrow the domain with the known edges
+        connected = 0
+        disconnected = 0
+        for direction, edge, _, _ in cell_edges:
+            if edges[edge] == EDGE_OPEN:
+                connected |= direction
+            elif edges[edge] == EDGE_CLOSED:
+                disconnected |= direction
+        domain = cell & DOMAIN & CONNECTION_DOMAINS[connected][disconnected][piece_class]
+        if not domain:
+            self.invalid = True
+            return
+        if domain != cell & DOMAIN:
+            cell = cell & ~DOMAIN | domain
+            self.set_cell(row, col, cell)
+
+        # Set the edges that every remaining rotation agrees on
+        domain >>= DOMAIN_SHIFT
+        always = ALWAYS_CONNECTIONS[piece_class][domain]
+        possible = ANY_CONNECTIONS[piece_class][domain]
+        for direction, edge, neighbor_row, neighbor_col in cell_edges:
+            if edges[edge] == EDGE_UNKNOWN:
+                if always & direction:
+                    self.set_edge(edge, EDGE_OPEN)
+                    self.pending.append((neighbor_row, neighbor_col))
+                elif not possible & direction:
+                    self.set_edge(edge, EDGE_CLOSED)
+                    self.pending.append((neighbor_row, neighbor_col))
+
+        # Place the piece once it has a single rotation left
+        if not cell & FIXED and not domain & domain - 1:
+            self.place(row, col, ROTATIONS[piece_class][domain.bit_length() - 1])
+
+# Rotations of every class, with the index of their domain bit, for the bitboard
+BIT_ROTATIONS = [(piece_class, k, rotation) for piece_class, rotations in ROTATIONS.items()
+                 for k, rotation in enumerate(rotations)]
+
+# Border masks of the bitboard, per number of rows
+BITBOARD_MASKS = {}
+
+def bitboard_masks(size: int) -> tuple:
+    """
+    Returns the masks of a square bitboard, where cell (row, col) is bit row * size + col.
+    The masks are computed once per size.
+
+    Args:
+        size (int): The number of rows (and columns) of the grid.
+
+    Returns:
+        tuple: The masks of every cell, of the first row, of the last row, of the first column and of the last column.
+    """
+    if size not in BITBOARD_MASKS:
+        row_mask = (1 << size) - 1
+        col_mask = sum(1 << row * size for row in range(size))
+        BITBOARD_MASKS[size] = ((1 << size * size) - 1, row_mask, row_mask << size * (size - 1),
+                                col_mask, col_mask << size - 1)
+    return BITBOARD_MASKS[size]
+
+class BitBoard(Board):
+    """
+    Board backend that keeps each plane of the board (the cells of each class, the cells with each
+    rotation in their domain, and the fixed cells) in a single Python int, with one bit per cell.
+    Propagation shifts the planes by a row or a column, so each step works on the whole board at once,
+    with no dependency beyond the standard library.
+    """
+
+    __slots__ = ('domain_planes', 'fixed_plane', 'class_planes', 'codes', 'masks')
+
+    vectorized = True
 
-    # Valid Actions Determination Functions Based on Position
+    def __init__(self, grid):
 
-    def valid_upper_left_corner_actions(piece: str):
         """
-        Determines valid actions for a piece located at the upper left corner of the grid.
+        Initializes a BitBoard object.
 
         Args:
-            piece (str): The piece identifier.
-
-        Returns:
-            list: A list of valid actions for the piece at the upper left corner.
-        """
-        # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FB', 'FD']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VB']
-        
-    def valid_upper_right_corner_actions(piece: str):
+            grid (list): The grid layout representing the board.
         """
-        Determines valid actions for a piece located at the upper right corner of the grid.
 
-        Args:
-            piece (str): The piece identifier.
+        # Seed the domains with the static rules of the puzzle, as the list board does
+        board = Board(grid)
+        self.set_planes([cell for row in board.cells for cell in row], board.num_rows)
 
-        Returns:
-            list: A list of valid actions for the piece at the upper right corner.
-        """
-         # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FB', 'FE']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VE']
-        
-    def valid_lower_left_corner_actions(piece: str):
+        self.invalid = board.invalid
+        self.pending = []
+        self.cursor = 0
+        self.action_count = 0
+        self.board_size = board.board_size
+        self.explored_count = 0
+        self.num_rows = board.num_rows
+        self.num_cols = board.num_cols
+        self.last_action = None
+        self.trail = None
+        self.zobrist_keys = board.zobrist_keys
+        self.hash_key = 0
+        self.positions = board.positions
+        self.components = None
+        self.buckets = None
+
+    def set_planes(self, cells: list, size: int):
         """
-        Determines valid actions for a piece located at the lower left corner of the grid.
+        Builds the planes of the board from its cells.
 
         Args:
-            piece (str): The piece identifier.
-
-        Returns:
-            list: A list of valid actions for the piece at the lower left corner.
-        """
-         # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FC', 'FD']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VD']
-         
-    def valid_lower_right_corner_actions(piece: str):
-        """
-        Determines valid actions for a piece located at the lower right corner of the grid.
+            cells (list): The cells of the board, in row-major order.
+            size (int): The number of rows (and columns) of the grid.
+        """
+        domain_planes = [0] * 4
+        fixed_plane = 0
+        class_planes = [0] * 4
+        for index, cell in enumerate(cells):
+            bit = 1 << index
+            class_planes[(cell & CODE) >> CLASS_SHIFT] |= bit
+            if cell & FIXED:
+                fixed_plane |= bit
+            for k in range(4):
+                if cell >> DOMAIN_SHIFT + k & 1:
+                    domain_planes[k] |= bit
+
+        # The initial piece codes and the planes of the classes never change, and are shared by every copy of the board
+        self.codes = [cell & CODE for cell in cells]
+        self.class_planes = tuple(class_planes)
+        self.masks = bitboard_masks(size)
+        self.domain_planes = tuple(domain_planes)
+        self.fixed_plane = fixed_plane
+
+    def rotation_index(self, index: int) -> int:
+        """
+        Returns the first rotation left in the domain of a cell.
 
         Args:
-            piece (str): The piece identifier.
+            index (int): The bit of the cell.
 
         Returns:
-            list: A list of valid actions for the piece at the lower right corner.
+            int: The index of the rotation in ROTATIONS, or -1 if the domain is empty.
         """
-         # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FC', 'FE']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VC']
-        
-    def valid_upper_edge_actions(piece: str):
+        for k, plane in enumerate(self.domain_planes):
+            if plane >> index & 1:
+                return k
+        return -1
+
+    def cell(self, index: int) -> int:
         """
-        Determines valid actions for a piece located at the upper edge of the grid.
+        Returns a cell in the format of Board.cells.
 
         Args:
-            piece (str): The piece identifier.
+            index (int): The bit of the cell.
 
         Returns:
-            list: A list of valid actions for the piece at the upper edge.
-        """
-        # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FB', 'FD', 'FE']
-        
-        # See if it is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-            return ['BB']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VB', 'VE']
-        
-        # See if it is a straight pipe
-        if piece in ('LH', 'LV'):
-            return ['LH']
-        
-    def valid_lower_edge_actions(piece: str):
+            int: The piece code, with the FIXED flag and the domain of the cell.
         """
-        Determines valid actions for a piece located at the lower edge of the grid.
+        domain = 0
+        for k, plane in enumerate(self.domain_planes):
+            domain |= (plane >> index & 1) << k
+        if self.fixed_plane >> index & 1:
+            return ROTATIONS[self.codes[index] >> CLASS_SHIFT][self.rotation_index(index)] | FIXED | domain << DOMAIN_SHIFT
+        return self.codes[index] | domain << DOMAIN_SHIFT
 
-        Args:
-            piece (str): The piece identifier.
-
-        Returns:
-            list: A list of valid actions for the piece at the lower edge.
+    @property
+    def cells(self) -> list:
         """
-        # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FC', 'FD', 'FE']
-        
-        # See if it is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-            return ['BC']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VD', 'VC']
-        
-        # See if piece is a straight pipe
-        if piece in ('LH', 'LV'):
-            return ['LH']
-            
-    def valid_left_edge_actions(piece: str):
+        Snapshot of the cells as a list of rows, in the same format as Board.cells.
         """
-        Determines valid actions for a piece located at the left edge of the grid.
+        num_cols = self.num_cols
+        return [[self.cell(row * num_cols + col) for col in range(num_cols)] for row in range(self.num_rows)]
 
-        Args:
-            piece (str): The piece identifier.
+    def copy(self):
+        """
+        Creates a copy of the board, to be modified by a new state. The planes are immutable ints,
+        so both boards share them until one of them changes.
 
         Returns:
-            list: A list of valid actions for the piece at the left edge.
-        """
-        # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FC', 'FB', 'FD']
-        
-        # See if it is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-            return ['BD']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VB', 'VD']
-        
-        # See if it is a straight pipe
-        if piece in ('LH', 'LV'):
-            return ['LV']
-        
-    def valid_right_edge_actions(piece: str):    
-        """
-        Determines valid actions for a piece located at the right edge of the grid.
+            BitBoard: A new board with the same planes and explored positions.
+        """
+        new_board = BitBoard.__new__(BitBoard)
+        new_board.domain_planes = self.domain_planes
+        new_board.fixed_plane = self.fixed_plane
+        new_board.class_planes = self.class_planes
+        new_board.codes = self.codes
+        new_board.masks = self.masks
+        new_board.invalid = False
+        new_board.pending = []
+        new_board.cursor = self.cursor
+        new_board.action_count = self.action_count
+        new_board.board_size = self.board_size
+        new_board.explored_count = self.explored_count
+        new_board.num_rows = self.num_rows
+        new_board.num_cols = self.num_cols
+        new_board.last_action = self.last_action
+        new_board.trail = None
+        new_board.zobrist_keys = self.zobrist_keys
+        new_board.hash_key = self.hash_key
+        new_board.positions = self.positions
+        new_board.components = None
+        new_board.buckets = None
+        return new_board
+
+    def same_cells(self, other) -> bool:
+        """
+        Compares the planes of two boards of the same instance.
 
         Args:
-            piece (str): The piece identifier.
+            other (BitBoard): The other board.
 
         Returns:
-            list: A list of valid actions for the piece at the right edge.
-        """   
-        # See if it is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-            return ['FC', 'FB', 'FE']
-        
-        # See if it is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-            return ['BE']
-        
-        # See if it a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-            return ['VE', 'VC']
-        
-        # See if it is a straight pipe
-        if piece in ('LH', 'LV'):
-            return ['LV']
-
-    # Valid Actions Determination Functions Based on Neighbors
+            bool: True if every plane is equal, False otherwise.
+        """
+        return self.fixed_plane == other.fixed_plane and self.domain_planes == other.domain_planes
 
-    def valid_actions_with_upper_neighbor(piece: str, upper_neighbor: str):
+    @classmethod
+    def from_snapshot(cls, snapshot):
         """
-        Returns valid actions for a piece considering the correct orientation of the upper neighbor.
+        Rebuilds a board from a snapshot created by pack.
 
         Args:
-            piece (str): The piece identifier.
-            upper_neighbor (str): The identifier of the upper neighbor.
+            snapshot (BoardSnapshot): The snapshot of the board.
 
         Returns:
-            list: A list of valid actions for the piece.
-        """
-        # If the piece is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-
-            # If the upper neighbor is connected to the lower neighbor
-            if upper_neighbor in ('BB', 'BE', 'BD', 'VB', 'VE', 'LV'):
-                return ['FC']
-            
-            
-            # If the upper neighbor is not connected to the lower neighbor
-            elif upper_neighbor in ('FC', 'FE', 'FD', 'BC', 'VC', 'VD', 'LH'):
-                return ['FB', 'FE', 'FD']
-        
-        # If piece is a fork pipe
-        elif piece in ('BC', 'BB', 'BE', 'BD'):
-
-            # If the upper neighbor is connected to the lower neighbor
-            if upper_neighbor in ('FB', 'BB', 'BE', 'BD', 'VB', 'VE', 'LV'):
-                return ['BC', 'BE', 'BD']
-            
-            # If the upper neighbor is not connected to the lower neighbor
-            else:
-                return ['BB']
-        
-        # If piece is a return pipe 
-        elif piece in ('VC', 'VB', 'VE', 'VD'):
-
-            # If the upper neighbor is connected to the lower neighbor
-            if upper_neighbor in ('FB', 'BB', 'BE', 'BD', 'VB', 'VE', 'LV'):
-                return ['VC', 'VD']
-            
-            # If the upper neighbor is not connected to the lower neighbor
-            else:
-                return ['VB', 'VE']
-            
-        # If piece is a straight pipe
-        elif piece in ('LH', 'LV'):
-
-            # If the upper neighbor is connected to the lower neighbor
-            if upper_neighbor in ('FB', 'BB', 'BE', 'BD', 'VB', 'VE', 'LV'):
-                return ['LV']
-            
-            # If the upper neighbor is not connected to the lower neighbor
-            else:
-                return ['LH']
-        
-        return []
-    
-    def valid_actions_with_lower_neighbor(piece: str, lower_neighbor: str):
+            BitBoard: A new board with the cells and counters of the snapshot.
         """
-        Returns valid actions for a piece considering the correct orientation of the lower neighbor.
-
-        Args:
-            piece (str): The piece identifier.
-            lower_neighbor (str): The identifier of the lower neighbor.
+        board = cls.__new__(cls)
+        board.set_planes([UNPACKED_CELLS[byte] for byte in snapshot.data], snapshot.num_cols)
+        snapshot.restore(board)
+        return board
 
-        Returns:
-            list: A list of valid actions for the piece.
-        """
-        # If the piece is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-
-            # If the lower neighbor is not connected to the upper neighbor
-            if lower_neighbor in ('FB', 'FE', 'FD', 'BB', 'VB', 'VE', 'LH'):
-                return ['FC', 'FE', 'FD']        
-            
-            # If the lower neighbor is connected to the upper neighbor
-            elif lower_neighbor in ('BC', 'BE', 'BD', 'VC', 'VD', 'LV'):
-                return ['FB'] 
-            
-        # If piece is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-
-            # If the lower neighbor is not connected to the upper neighbor
-            if lower_neighbor in ('FB', 'FE', 'FD', 'BB', 'VB', 'VE', 'LH'):
-                return ['BC'] 
-            
-            # If the lower neighbor is connected to the upper neighbor
-            else:
-                return ['BB', 'BE', 'BD'] 
-            
-        # If piece is a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-
-            # If the lower neighbor is not connected to the upper neighbor
-            if lower_neighbor in ('FB', 'FE', 'FD', 'BB', 'VB', 'VE', 'LH'):
-                return ['VC', 'VD'] 
-            
-            # If the lower neighbor is connected to the upper neighbor
-            else:
-                return ['VB', 'VE'] 
-            
-        # If piece is a straight pipe
-        if piece in ('LH', 'LV'):
-
-            # If the lower neighbor is not connected to the upper neighbor
-            if lower_neighbor in ('FB', 'FE', 'FD', 'BB', 'VB', 'VE', 'LH'):
-                return ['LH'] 
-            
-            # If the lower neighbor is connected to the upper neighbor
-            else:
-                return ['LV'] 
-            
-    def valid_actions_with_left_neighbor(piece: str, left_neighbor: str):
+    def unwind(self, position: int):
         """
-        Returns valid actions for a piece considering the correct orientation of the left neighbor.
+        Restores the planes recorded in the trail after the given position.
 
         Args:
-            piece (str): The piece identifier.
-            left_neighbor (str): The identifier of the left neighbor.
-
-        Returns:
-            list: A list of valid actions for the piece.
-        """  
-        # If the piece is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-
-            # If the left neighbor is connected to the right neighbor
-            if left_neighbor in ('BB', 'BC', 'BD', 'VD', 'VB', 'LH'):
-                return ['FE'] 
-            
-            # If the left neighbor is not connected to the right neighbor
-            elif left_neighbor in ('FC', 'FB', 'FE', 'BE', 'VC', 'VE', 'LV'):
-                return ['FB', 'FC', 'FD']
-        
-        # If piece is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-
-            # If the left neighbor is connected to the right neighbor
-            if left_neighbor in ('FD', 'BB', 'BC', 'BD', 'VD', 'VB', 'LH'):
-                return ['BC', 'BE', 'BB']
-            
-            # If the left neighbor is not connected to the right neighbor
-            else:
-                return ['BD']
-        
-        # If piece is a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-
-            # If the left neighbor is connected to the right neighbor
-            if left_neighbor in ('FD', 'BB', 'BC', 'BD', 'VD', 'VB', 'LH'):
-                return ['VC', 'VE']
-            
-            # If the left neighbor is not connected to the right neighbor
-            else:
-                return ['VB', 'VD']
-        
-        # If piece is a straight pipe
-        if piece in ('LH', 'LV'):
-
-            # If the left neighbor is connected to the right neighbor
-            if left_neighbor in ('FD', 'BB', 'BC', 'BD', 'VD', 'VB', 'LH'):
-                return ['LH']
-            
-            # If the left neighbor is not connected to the right neighbor
-            else:
-                return ['LV']
-
-        return []
+            position (int): The length of the trail to go back to.
+        """
+        trail = self.trail
+        while len(trail) > position:
+            self.domain_planes, self.fixed_plane = trail.pop()
 
-    def valid_actions_with_right_neighbor(piece: str, right_neighbor: str):
+    def get_value(self, row: int, col: int) -> str:
         """
-        Returns valid actions for a piece considering the correct orientation of the right neighbor.
+        Gets the value (piece identifier) at the given position in the grid.
 
         Args:
-            piece (str): The piece identifier.
-            right_neighbor (str): The identifier of the right neighbor.
+            row (int): The row index of the position.
+            col (int): The column index of the position.
 
         Returns:
-            list: A list of valid actions for the piece.
-        """
-        # If the piece is a locking pipe
-        if piece in ('FC', 'FB', 'FE', 'FD'):
-
-            # If the right neighbor is  connected to the left neighbor
-            if right_neighbor in ('BC', 'BB', 'BE', 'VC', 'VE', 'LH'):
-                return ['FD']
-            
-            # If the right neighbor is not connected to the left neighbor
-            elif right_neighbor in ('FC', 'FD', 'FB', 'BD', 'VD', 'VB', 'LV'):
-                return ['FB', 'FE', 'FC'] 
-            
-        # If piece is a fork pipe
-        if piece in ('BC', 'BB', 'BE', 'BD'):
-
-            # If the right neighbor is connected to the left neighbor
-            if right_neighbor in ('FE','BC', 'BB', 'BE', 'VC', 'VE', 'LH'):
-                return ['BC', 'BB', 'BD']
-            
-            # If the right neighbor is not connected to the left neighbor
-            else:
-                return ['BE']
-        
-        # If piece is a return pipe
-        if piece in ('VC', 'VB', 'VE', 'VD'):
-
-            # If the right neighbor is connected to the left neighbor
-            if right_neighbor in ('FE','BC', 'BB', 'BE', 'VC', 'VE', 'LH'):
-                return ['VB', 'VD']
-            
-            # If the right neighbor is not connected to the left neighbor
-            else:
-                return ['VC', 'VE']
-        
-        # If piece is a straight pipe
-        if piece in ('LH', 'LV'):
-
-            # If the right neighbor is connected to the left neighbor
-            if right_neighbor in ('FE','BC', 'BB', 'BE', 'VC', 'VE', 'LH'):
-                return ['LH']
-            
-            # If the right neighbor is not connected to the left neighbor
-            else:
-                return ['LV']
+            str: The piece identifier at the specified position.
+        """
+        return PIECE_NAMES[self.cell(row * self.num_cols + col) & CODE]
 
-        return []
-    
-    # Rotation Functions
-    
-    def get_all_rotations(self, piece: str):
+    def is_explored(self, row: int, col: int) -> bool:
         """
-        Returns all possible rotations for a piece.
+        Checks if the piece at the given position is already in its final orientation.
 
         Args:
-            piece (str): The piece identifier.
+            row (int): The row index of the position.
+            col (int): The column index of the position.
 
         Returns:
-            list: A list of all possible rotations for the piece.
-        """
-        # Define possible rotations for each piece
-        rotations = {
-            'FC': ['FC', 'FB', 'FE', 'FD'],
-            'FB': ['FC', 'FB', 'FE', 'FD'],
-            'FE': ['FC', 'FB', 'FE', 'FD'],
-            'FD': ['FC', 'FB', 'FE', 'FD'],
-            'BC': ['BC', 'BB', 'BE', 'BD'],
-            'BB': ['BC', 'BB', 'BE', 'BD'],
-            'BE': ['BC', 'BB', 'BE', 'BD'],
-            'BD': ['BC', 'BB', 'BE', 'BD'],
-            'VC': ['VC', 'VB', 'VE', 'VD'],
-            'VB': ['VC', 'VB', 'VE', 'VD'],
-            'VE': ['VC', 'VB', 'VE', 'VD'],
-            'VD': ['VC', 'VB', 'VE', 'VD'],
-            'LH': ['LH', 'LV'],
-            'LV': ['LH', 'LV']
-        }
-        
-        # Return possible rotations for the given piece
-        return rotations.get(piece, [])
+            bool: True if the position is explored, False otherwise.
+        """
+        return bool(self.fixed_plane >> row * self.num_cols + col & 1)
 
-    def piece_restrictions(self, row: int, col: int) -> list:
+    def fix(self, row: int, col: int, piece: int):
         """
-        Returns valid rotations based on the types of pieces in the neighbors of the given position.
+        Places a piece in its final orientation at the given position.
 
         Args:
             row (int): The row index of the position.
             col (int): The column index of the position.
-
-        Returns:
-            list: A list of valid rotations based on the F pieces in the neighbors.
+            piece (int): The piece code of the final orientation.
         """
+        index = row * self.num_cols + col
+        bit = 1 << index
+        rotation = ROTATION_INDEX[piece & CODE]
 
-        piece = self.board.get_value(row, col)
-        neighbors_count = 0
-
-        # Neighbors that are F pieces
-        upper = False
-        lower = False
-        left = False
-        right = False
-
-        # Returns [upper, lower, left, right] neighbors that are F pieces
-        if row > 0:
-            # If upper neighbor is starts with F
-            if self.board.get_value(row-1, col).startswith('F'):
-                upper = True
-                neighbors_count += 1
-        
-        if row < self.board.num_rows - 1:
-            # If lower neighbor is starts with F
-            if self.board.get_value(row+1, col).startswith('F'):
-                lower = True
-                neighbors_count += 1
+        # Update the hash, replacing the previous rotation if the position was already explored
+        if self.fixed_plane & bit:
+            self.hash_key ^= self.zobrist_keys[index * 4 + self.rotation_index(index)]
+        else:
+            self.explored_count += 1
+        self.hash_key ^= self.zobrist_keys[index * 4 + rotation]
 
-        if col > 0:
-            # If left neighbor is starts with F
-            if self.board.get_value(row, col-1).startswith('F'):
-                left = True
-                neighbors_count += 1
-
-        if col < self.board.num_cols - 1:
-            # If right neighbor is starts with F
-            if self.board.get_value(row, col+1).startswith('F'):
-                right = True
-                neighbors_count += 1
-        
-        # If piece starts with F
-        if piece.startswith('F'):
-
-            # If there is only one F neighbor
-            if neighbors_count == 1:
-                if upper == True:
-                    return ['FB', 'FE', 'FD']
-                if left == True:
-                    return ['FC', 'FD', 'FB']
-                if lower == True:
-                    return ['FC', 'FE', 'FD']
-                if right == True:
-                    return ['FC', 'FB', 'FE']
-            
-            # If there are two F neighbors
-            if neighbors_count == 2:
-                if upper == True and lower == True:
-                    return ['FE', 'FD']
-                if left == True and right == True:
-                    return ['FC', 'FB']
-                if upper == True and right == True:
-                    return ['FE', 'FB']
-                if upper == True and left == True:
-                    return ['FD', 'FB']
-                if lower == True and right == True:
-                    return ['FE', 'FC']
-                if lower == True and left == True:
-                    return ['FD', 'FC']
-            
-            # If there are three F neighbors
-            if neighbors_count == 3:
-                if upper == False:
-                    return ['FC']
-                if lower == False:
-                    return ['FB']
-                if left == False:
-                    return ['FE']
-                if right == False:
-                    return ['FD']
-            
-        # If the piece starts with V
-        if piece.startswith('V'):
-
-            # If there is only two F neighbor
-            if neighbors_count == 2:
-                if upper == True and right == True:
-                    return ['VC', 'VE', 'VB']
-                if upper == True and left == True:
-                    return ['VD', 'VE', 'VB']
-                if lower == True and right == True:
-                    return ['VC', 'VD', 'VE']
-                if lower == True and left == True:
-                    return ['VC', 'VD', 'VB']
-            
-            # If there are three F neighbors
-            if neighbors_count == 3:
-                if upper == False:
-                    return ['VC', 'VD']
-                if lower == False:
-                    return ['VB', 'VE']
-                if left == False:
-                    return ['VC', 'VE']
-                if right == False:
-                    return ['VD', 'VB']
-
-        # If the piece starts with L
-        if piece.startswith('L'):
-
-            # If there is only two F neighbor
-            if neighbors_count == 2:
-                if upper == True and lower == True:
-                    return ['LH']
-                if left == True and right == True:
-                    return ['LV']
-                
-            # If there are three F neighbors
-            if neighbors_count == 3:
-                if upper == False:
-                    return ['LV']
-                if lower == False:
-                    return ['LV']
-                if left == False:
-                    return ['LH']
-                if right == False:
-                    return ['LH']
-        
-        return self.board.get_all_rotations(piece)
+        # Record the previous planes to be able to undo the change
+        if self.trail is not None:
+            self.trail.append((self.domain_planes, self.fixed_plane))
+        self.domain_planes = tuple(plane | bit if k == rotation else plane & ~bit
+                                   for k, plane in enumerate(self.domain_planes))
+        self.fixed_plane |= bit
 
-    def get_valid_rotations_pos(self, piece: str, row: int, col: int) -> list:     
+    def connection_planes(self, domain_planes: tuple) -> tuple:
         """
-        Returns valid rotations of a piece based on the limits of the grid.
+        Computes, for each direction, the cells where some rotation of the domain connects to it
+        and the cells where some rotation does not.
 
         Args:
-            piece (str): The piece identifier.
-            row (int): The row index of the piece on the grid.
-            col (int): The column index of the piece on the grid.
+            domain_planes (tuple): The planes of the cells with each rotation in their domain.
 
         Returns:
-            list: A list of valid rotations for the piece at the specified position.
-        """  
-        valid_rotations = []
-        # Check if the piece is a upper left corner
-        if self.board.is_corner_upper_left(row, col):
-            valid_rotations.append(Board.valid_upper_left_corner_actions(piece))
-
-        # Check if the piece is a upper right corner
-        elif self.board.is_corner_upper_right(row, col):
-            valid_rotations.append(Board.valid_upper_right_corner_actions(piece))
-
-        # Check if the piece is a lower left corner
-        elif self.board.is_corner_lower_left(row, col):
-            valid_rotations.append(Board.valid_lower_left_corner_actions(piece))
-
-        # Check if the piece is a lower right corner
-        elif self.board.is_corner_lower_right(row, col):
-            valid_rotations.append(Board.valid_lower_right_corner_actions(piece))
-
-        # Check if the piece is an upper edge
-        elif self.board.is_edge_upper(row, col) and not (self.board.is_corner_upper_left(row, col) or self.board.is_corner_upper_right(row, col)):
-            valid_rotations.append(Board.valid_upper_edge_actions(piece))
-
-        # Check if the piece is a lower edge
-        elif self.board.is_edge_lower(row, col) and not (self.board.is_corner_lower_left(row, col) or self.board.is_corner_lower_right(row, col)):
-            valid_rotations.append(Board.valid_lower_edge_actions(piece))
-
-        # Check if the piece is a upper edge
-        elif self.board.is_edge_left(row, col) and not (self.board.is_corner_upper_left(row, col) or self.board.is_corner_upper_right(row, col)):
-            valid_rotations.append(Board.valid_left_edge_actions(piece))
-
-        # Check if the piece is a right edge
-        elif self.board.is_edge_right(row, col) and not (self.board.is_corner_upper_right(row, col) or self.board.is_corner_lower_right(row, col)):
-            valid_rotations.append(Board.valid_right_edge_actions(piece))
-
-        # Join all the valid rotations into single array
-        valid_rot = []
-        for rot in valid_rotations:
-            valid_rot.extend(rot)
-
-        return valid_rot
-    
-    def get_valid_rotations_neighbors(self, piece: str, row: int, col: int) -> list:
-        """
-        Returns valid positions based on neighbors that are already in their final position.
+            tuple: Two dictionaries from direction to plane.
+        """
+        connects = {UP: 0, DOWN: 0, LEFT: 0, RIGHT: 0}
+        avoids = {UP: 0, DOWN: 0, LEFT: 0, RIGHT: 0}
+        for piece_class, k, rotation in BIT_ROTATIONS:
+            cells = self.class_planes[piece_class] & domain_planes[k]
+            for direction in connects:
+                if rotation & direction:
+                    connects[direction] |= cells
+                else:
+                    avoids[direction] |= cells
+        return connects, avoids
+
+    def propagate(self):
+        """
+        Narrows the domains of the whole board until a fixpoint. Each sweep shifts the connections
+        that every rotation of a neighbor has, and the ones that none of them has, into the cells
+        next to it, and removes the rotations that disagree with them. Afterwards, the pieces left
+        with a single valid rotation are placed. Marks the board as invalid if a domain becomes empty.
+        """
+        all_cells, top, bottom, left, right = self.masks
+        size = self.num_cols
+        inner_left = all_cells & ~left
+        inner_right = all_cells & ~right
+        planes = self.domain_planes
+
+        while True:
+            connects, avoids = self.connection_planes(planes)
+
+            # Directions each piece must connect to, because every rotation of the neighbor connects back
+            must = {
+                UP: (all_cells & ~avoids[DOWN]) << size & all_cells,
+                DOWN: (all_cells & ~avoids[UP]) >> size,
+                LEFT: (all_cells & ~avoids[RIGHT]) << 1 & inner_left,
+                RIGHT: (all_cells & ~avoids[LEFT]) >> 1 & inner_right,
+            }
+
+            # Directions each piece must not connect to, because they lead outside or no rotation of the neighbor connects back
+            must_not = {
+                UP: (all_cells & ~connects[DOWN]) << size & all_cells | top,
+                DOWN: (all_cells & ~connects[UP]) >> size | bottom,
+                LEFT: (all_cells & ~connects[RIGHT]) << 1 & inner_left | left,
+                RIGHT: (all_cells & ~connects[LEFT]) >> 1 & inner_right | right,
+            }
+
+            # Remove each rotation from the cells where it disagrees with a neighbor
+            narrowed = list(planes)
+            for piece_class, k, rotation in BIT_ROTATIONS:
+                conflicts = 0
+                for direction in must:
+                    conflicts |= must_not[direction] if rotation & direction else must[direction]
+                narrowed[k] &= ~(self.class_planes[piece_class] & conflicts)
+            narrowed = tuple(narrowed)
+
+            if narrowed[0] | narrowed[1] | narrowed[2] | narrowed[3] != all_cells:
+                self.invalid = True
+                return
+            if narrowed == planes:
+                break
+            planes = narrowed
+
+        # Find the pieces left with a single valid rotation
+        first, second, third, fourth = planes
+        several = first & second | third & fourth | (first | second) & (third | fourth)
+        forced = all_cells & ~several & ~self.fixed_plane
+
+        # Record the previous planes to be able to undo the sweep
+        if self.trail is not None and (forced or planes != self.domain_planes):
+            self.trail.append((self.domain_planes, self.fixed_plane))
+        self.domain_planes = planes
+
+        # Place them, updating the hash one piece at a time
+        for k, plane in enumerate(planes):
+            cells = plane & forced
+            while cells:
+                bit = cells & -cells
+                self.hash_key ^= self.zobrist_keys[(bit.bit_length() - 1) * 4 + k]
+                self.explored_count += 1
+                cells ^= bit
+        self.fixed_plane |= forced
+
+    def branch_rotations(self, order: str) -> list:
+        """
+        Returns the rotations to branch on: the valid rotations of the first unexplored cell in a static order.
 
         Args:
-            piece (str): The piece identifier.
-            row (int): The row index of the piece on the grid.
-            col (int): The column index of the piece on the grid.
+            order (str): The name of the order in STATIC_ORDERS.
 
         Returns:
-            list: A list of valid rotations based on the neighboring pieces.
-        """
-
-        # Initialize lists for the rotations of the neighbors
-        upper = []
-        lower = []
-        left = []
-        right = []
+            list: A list of (piece, row, col) actions, empty if every cell is explored.
+        """
+        # Skip the explored positions, which stay explored in every state that follows
+        order = cell_order(order, self.num_rows)
+        cursor = self.cursor
+        while cursor < len(order) and self.fixed_plane >> order[cursor][0] * self.num_cols + order[cursor][1] & 1:
+            cursor += 1
+        self.cursor = cursor
+        if cursor == len(order):
+            return []
 
-        # Initialize a list to check if the neighbors are in the correct orientation
-        exists = [False, False, False, False]   
-        rotations = [upper, lower, left, right]
+        row, col = order[cursor]
+        cell = self.cell(row * self.num_cols + col)
+        return [(rotation, row, col) for rotation in DOMAIN_NAMES[(cell & CODE) >> CLASS_SHIFT][(cell & DOMAIN) >> DOMAIN_SHIFT]]
 
-        # Initialize a list to store the neighbors that are in the correct orientation
-        existing_neighbors = []
+    def is_solved(self) -> bool:
+        """
+        Checks if a fully explored board is a solution: no connection leads into the border or to
+        a neighbor that does not connect back, there are exactly enough connections for a tree,
+        and every cell is reached from the upper left corner.
 
-        # See if upper neighbor is in the correct orientation 
-        if row > 0:
-            if self.explored_grid[row-1][col] != ' ':
-                
-                # Get the valid rotations based on the upper neighbor
-                upper.extend(Board.valid_actions_with_upper_neighbor(piece, self.board.explored_grid[row-1][col]))
-                if len(upper) > 0:
-                    exists[0] = True
-
-        # See if lower neighbor is in the correct orientation
-        if row < self.board.num_rows - 1:
-            if self.explored_grid[row+1][col] != ' ':
-
-                # Get the valid rotations based on the lower neighbor
-                lower.extend(Board.valid_actions_with_lower_neighbor(piece, self.board.explored_grid[row+1][col]))
-                if len(lower) > 0:
-                    exists[1] = True
-        
-        # See if left neighbor is in the correct orientation
-        if col > 0:
-            if self.explored_grid[row][col-1] != ' ':
+        Returns:
+            bool: True if the board is a solution, False otherwise.
+        """
+        all_cells, top, bottom, left, right = self.masks
+        size = self.num_cols
+        connects, _ = self.connection_planes(self.domain_planes)
 
-                # Get the valid rotations based on the left neighbor
-                left.extend(Board.valid_actions_with_left_neighbor(piece, self.board.explored_grid[row][col-1]))
-                if len(left) > 0:  
-                    exists[2] = True
+        # Each connection up or left is matched by the neighbor, and none leads down or right out of the grid
+        if (connects[DOWN] << size & all_cells != connects[UP] or connects[RIGHT] << 1 & all_cells & ~left != connects[LEFT]
+                or connects[DOWN] & bottom or connects[RIGHT] & right):
+            return False
+        if bin(connects[DOWN]).count('1') + bin(connects[RIGHT]).count('1') != self.board_size - 1:
+            return False
 
+        # Flood the connections from the upper left corner
+        reached = 1
+        while True:
+            spread = (reached | (reached & connects[DOWN]) << size | (reached & connects[UP]) >> size
+                      | (reached & connects[RIGHT]) << 1 | (reached & connects[LEFT]) >> 1)
+            if spread == reached:
+                return reached == all_cells
+            reached = spread
 
-        # See if right neighbor is in the correct orientation
-        if col < self.board.num_cols - 1:
-            if self.explored_grid[row][col+1] != ' ':
+class BoardSnapshot:
+    """
+    Compact, immutable copy of a board, used to keep many states in the frontier. The cells are
+    packed in a bytes object with one byte per cell, and the board is rebuilt from it on demand.
+    """
 
-                # Get the valid rotations based on the right neighbor
-                right.extend(Board.valid_actions_with_right_neighbor(piece, self.board.explored_grid[row][col+1]))
-                if len(right) > 0:
-                    exists[3] = True
+    __slots__ = ('board_class', 'data', 'num_cols', 'invalid', 'cursor', 'action_count',
+                 'board_size', 'explored_count', 'last_action', 'hash_key', 'missing_connections')
 
-        
-        
-        # Check which have valid rotations
-        for i in range(4):
-            if exists[i]:
-                existing_neighbors.append(rotations[i])
-
-        # Do the intersection of the lists
-        intersect_rotations = []
-        if len(existing_neighbors) > 0:
-            intersect_rotations = existing_neighbors[0]
-            for i in range(1, len(existing_neighbors)):
-                intersect_rotations = [value for value in intersect_rotations if value in existing_neighbors[i]]
-
-         # Check if no neighbors are in the correct orientation
-        if exists == [False, False, False, False]:
-            intersect_rotations = board.get_all_rotations(piece)
-
-        # Check if piece (except B pieces) have F pieces in the neighbors
-        f_neighbor_restrictions = self.piece_restrictions(row, col)
-        
-        # Intersect the valid rotations with the F piece restrictions
-        if f_neighbor_restrictions != None:
-            intersect_rotations = [value for value in intersect_rotations if value in f_neighbor_restrictions]
-        return intersect_rotations
+    # Last snapshot unpacked and its board, so that a state expanded right after being selected is unpacked once
+    unpacked = (None, None)
 
-    def get_valid_rotations(self, piece: str, row: int, col: int) -> list:
+    def __init__(self, board: Board, data: bytes):
         """
-        Returns valid rotations for a piece considering both its position and neighboring pieces.
+        Initializes a BoardSnapshot object.
 
         Args:
-            piece (str): The piece identifier.
-            row (int): The row index of the piece on the grid.
-            col (int): The column index of the piece on the grid.
-
-        Returns:
-            list: A list of valid rotations for the piece at the specified position.
+            board (Board): The board to take the counters and flags from.
+            data (bytes): The packed cells of the board.
         """
+        self.board_class = type(board)
+        self.data = data
+        self.num_cols = board.num_cols
+        self.invalid = board.invalid
+        self.cursor = board.cursor
+        self.action_count = board.action_count
+        self.board_size = board.board_size
+        self.explored_count = board.explored_count
+        self.last_action = board.last_action
+        self.hash_key = board.hash_key
+        self.missing_connections = board.missing_connections
 
-        # Check if the piece is already in the correct position
-        if self.explored_grid[row][col] != ' ':
-            # If so, return an empty list
-            return []
-
-        # Get the valid rotations based on the limits of the grid
-        valid_rotations_pos = self.get_valid_rotations_pos(piece, row, col) 
-
-        # Get the valid rotations based on the neighbors of the piece that are already in the correct position
-        valid_rotations_neighbors = self.get_valid_rotations_neighbors(piece, row, col) 
-
-        # Do the intersection of the two lists
-        valid_rotations = []
-
-        # See if there are limitations on the piece's position (outer border or not)
-        if len(valid_rotations_neighbors) != 0 and len(valid_rotations_pos) != 0:
-
-            # If so, the valid rotations are the intersection of the two lists
-            valid_rotations = [(value, row, col) for value in valid_rotations_pos if value in valid_rotations_neighbors]
-
-        # If the piece is not in the outer border
-        elif len(valid_rotations_pos) == 0 and len(valid_rotations_neighbors) != 0:
+    @property
+    def board(self) -> Board:
+        """
+        Board rebuilt from the snapshot.
+        """
+        snapshot, board = BoardSnapshot.unpacked
+        if snapshot is not self:
+            board = self.board_class.from_snapshot(self)
+            BoardSnapshot.unpacked = (self, board)
+        return board
 
-            # If so, the valid rotations are the list of valid rotations based on the neighbors
-            valid_rotations = [(value, row, col) for value in valid_rotations_neighbors]
-    
-        return valid_rotations
+    def restore(self, board: Board):
+        """
+        Sets the counters and flags of a board being rebuilt from the snapshot.
 
+        Args:
+            board (Board): The board being rebuilt.
+        """
+        board.invalid = self.invalid
+        board.pending = []
+        board.cursor = self.cursor
+        board.action_count = self.action_count
+        board.board_size = self.board_size
+        board.explored_count = self.explored_count
+        board.num_rows = self.board_size // self.num_cols
+        board.num_cols = self.num_cols
+        board.last_action = self.last_action
+        board.trail = None
+        board.zobrist_keys = zobrist_keys(self.board_size)
+        board.hash_key = self.hash_key
+        board.positions = grid_positions(board.num_rows)
+        board.components = None
+        board.changed = None
+        board.buckets = None
 
-    @staticmethod
-    def parse_instance():
+    def __hash__(self):
         """
-        Parses an input string representing the problem instance and returns a Board instance.
+        Hash of the explored positions of the board.
+        """
+        return self.hash_key
 
-        Returns:
-            Board: An instance of the Board class representing the parsed grid.
+    def __eq__(self, other):
         """
-        grid = []
-        input_str = sys.stdin.read().strip()  # Read the entire input
-    
-        lines = input_str.split('\n')  # Split by newline characters
-        for line in lines:
-            pieces = line.split()  # Split by whitespaces
-            grid.append(pieces)
+        Checks if the snapshot has the same pieces in their final orientation as another board or state.
+        Two snapshots are compared without unpacking them.
 
-        # Create a Board instance with the parsed grid
-        return Board(grid)
+        Args:
+            other (BoardSnapshot, Board or PipeManiaState): The other snapshot, board or state to compare with.
+        """
+        if isinstance(other, PipeManiaState):
+            other = other.contents
+        if isinstance(other, BoardSnapshot):
+            if self.hash_key != other.hash_key or self.explored_count != other.explored_count:
+                return False
+            return self.board_class is other.board_class and self.data == other.data
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.board == other
 
 class PipeManiaState:
+    # Fixed set of attributes, so that states carry no per-instance dictionary
+    __slots__ = ('contents', 'id')
+
     # Static variable to keep track of the state id
     state_id = 0
 
-    def __init__(self, board: Board):
+    def __init__(self, board):
         """
         Initializes a new PipeManiaState instance.
 
         Args:
-            board (Board): The board
+            board (Board or BoardSnapshot): The board, or a snapshot of it
         """
 
-        # Set the board 
-        self.board = board
+        # Set the board, or its snapshot
+        self.contents = board
         
         # Set the state id
         self.id = PipeManiaState.state_id
@@ -1016,6 +2831,12 @@ class PipeManiaState:
         # Increment the state id
         PipeManiaState.state_id += 1
 
+    @property
+    def board(self) -> Board:
+        """
+        Board of the state, rebuilt from the snapshot if the state holds one.
+        """
+        return self.contents.board
 
     def __lt__(self, other):
         """This method is used in case of a tie in managing the open list in informed searches.
@@ -1023,18 +2844,95 @@ class PipeManiaState:
         Args:
             other (PipeManiaState): The other state to compare with.
         """
-        return self.board.action_count > other.board.action_count
+        if self.contents.action_count != other.contents.action_count:
+            return self.contents.action_count > other.contents.action_count
+
+        # Then the state created first, which is the sibling whose action was listed first
+        return self.id < other.id
+
+    def __hash__(self):
+        """The hash of the board, so that states with the same explored pieces share it."""
+        return self.contents.hash_key
+
+    def __eq__(self, other):
+        """Two states are equal when their boards have the same pieces in their final orientation,
+        whatever the order of the actions that placed them.
+
+        Args:
+            other (PipeManiaState or Board): The other state to compare with.
+        """
+        if isinstance(other, PipeManiaState):
+            other = other.contents
+        if not isinstance(other, (Board, BoardSnapshot)):
+            return NotImplemented
+        return self.contents == other
 
 class PipeMania(Problem):
 
-    def __init__(self, initial_state: Board):
-        """The constructor specifies the initial state."""
+    def __init__(self, initial_state: Board, packed: bool = False, probe: bool = False, two_sat: bool = False,
+                 patterns: bool = False, bridges: bool = False, branching: str = 'diagonal', values: str = 'given'):
+        """The constructor specifies the initial state.
+
+        Args:
+            initial_state (Board): The board to solve.
+            packed (bool): Whether the new states keep a packed snapshot of their board instead of the board.
+            probe (bool): Whether to try each rotation of a cell before branching on it, and drop the ones
+                that propagation proves invalid.
+            two_sat (bool): Whether to solve the cells left with two valid rotations as a 2-SAT problem before
+                branching, placing the rotations it forces.
+            patterns (bool): Whether to narrow the domains with the pattern database of the 2x2 windows
+                after each propagation (boards that are not vectorized).
+            bridges (bool): Whether to open the bridges and close the cycles of the graph of the connections
+                that may still be open, after each propagation (boards that are not vectorized).
+            branching (str): How to choose the cell to branch on: the name of a static order in STATIC_ORDERS,
+                whose first unexplored cell is taken, or of a dynamic order in DYNAMIC_ORDERS (boards that are
+                not vectorized, which fall back to the diagonal order).
+            values (str): How to order the rotations of the cell to branch on, least constraining first:
+                'given' to keep the order of its domain, 'neighbors' by the rotations removed from the domains
+                of its neighbors (boards that are not vectorized, which fall back to 'propagation'), or
+                'propagation' by the pieces that propagation places after it.
+        """
+
+        self.initial = PipeManiaState(initial_state)
+        self.packed = packed
+        self.probe = probe
+        self.two_sat = two_sat
+        self.patterns = patterns and not initial_state.vectorized
+        self.bridges = bridges and not initial_state.vectorized
+        self.branching = branching
+        if branching in DYNAMIC_ORDERS and initial_state.vectorized:
+            self.branching = 'diagonal'
+        self.values = values
+        if values == 'neighbors' and initial_state.vectorized:
+            self.values = 'propagation'
+
+        # Place the pieces with a single valid rotation from the start
+        self.propagate(initial_state)
+
+    def propagate(self, board: Board):
+        """
+        Propagates the pieces placed on a board, alternating with the pattern database and the bridges
+        when enabled, until none of them narrows a domain. The bridges are only searched once the
+        cheaper window filter has nothing left to narrow.
+
+        Args:
+            board (Board): The board to propagate.
+        """
+        board.propagate()
+        while self.patterns and not board.invalid and board.filter_windows():
+            board.propagate()
 
-        self.initial = initial_state
+        # The bridges look at the whole board, so they are searched once per propagation
+        if self.bridges and not board.invalid and board.force_bridges():
+            board.propagate()
+            while self.patterns and not board.invalid and board.filter_windows():
+                board.propagate()
 
     def actions(self, state: PipeManiaState):
         """
-        Returns a list of actions that can be executed from the given state.
+        Returns a list of actions that can be executed from the given state. The pieces with a
+        single valid rotation are already placed by the propagation of result, so the actions
+        branch on the rotations of the piece chosen by the branching order.
 
         Args:
             state (PipeManiaState): The current state of the Pipe Mania puzzle.
@@ -1042,76 +2940,175 @@ class PipeMania(Problem):
         Returns:
             list: A list of actions that can be executed from the given state.
         """
-        num_rows, num_cols = state.board.num_rows, state.board.num_cols
-        unique_actions = [] 
-        available_actions = []
+        board = state.board
 
         # Check if the board is invalid
-        if state.board.invalid:
+        if board.invalid:
             return []
 
-        # Check if there are still only unique actions to be explored
-        if state.board.unique_to_be_explored:
-            for row in range(num_rows):
-                for col in range(num_cols):
-                    piece = state.board.get_value(row, col)
-                    valid_rotations = state.board.get_valid_rotations(piece, row, col)
+        # Place every rotation forced by the cells with two valid rotations in a single action
+        if self.two_sat:
+            forced = self.binary_actions(state)
+            if board.invalid:
+                return []
+            if forced:
+                return [forced]
 
-                    # If there is only one valid rotation for a piece
-                    if len(valid_rotations) == 1:
-                        # Mark the position as explored
-                        state.board.explored_grid[row][col] = valid_rotations[0][0]
+        # Boards backed by arrays branch on the domains left by their sweeps
+        if board.vectorized:
+            actions = self.vectorized_actions(state)
 
-                        # Accumulate the unique action
-                        available_actions.append(valid_rotations[0])
-        
-            if available_actions:
-                return [available_actions]
-
-        # Mark the board as not unique to be explored if there are no unique actions
-        state.board.unique_to_be_explored = False
-
-        """
-        For a center exploration method, replace iterating logic with:
-        center_row, center_col = num_rows // 2, num_cols // 2
-        cells = [(row, col) for row in range(num_rows) for col in range(num_cols)]
-        cells.sort(key=lambda cell: abs(cell[0] - center_row) + abs(cell[1] - center_col))
-
-        for row, col in cells:
-            (...)
-        """
-
-        # Iterate the board in a diagonal manner
-        for s in range(num_rows + num_cols - 1):
-            for row in range(max(0, s - num_cols + 1), min(s + 1, num_rows)):
-                col = s - row
-                # If the position is not explored
-                if state.board.explored_grid[row][col] == ' ':
-                    piece = state.board.get_value(row, col)
-                    valid_rotations = state.board.get_valid_rotations(piece, row, col)
-                    # If there is more than one valid rotation for a piece
-                    if len(valid_rotations) > 1:
-                        for rotation in valid_rotations:
-                            action = unique_actions.copy()
-                            action.append(rotation)
-                            available_actions.append(action)
-                        # Return unique actions along with one of the valid rotations
-                        return available_actions
-
-                    # If there is no valid rotation for a piece, mark the board as invalid
-                    if not valid_rotations:
-                        if not available_actions:
-                            if not unique_actions:
-                                state.board.invalid = True
-                                return []
-                            return unique_actions
+        else:
+            if self.branching in DYNAMIC_ORDERS:
+                # Ask the dynamic order for the piece, looking at the current board
+                position = DYNAMIC_ORDERS[self.branching](board)
+                if position is None:
+                    return []
+                row, col = position
 
-                    else:
-                        state.board.explored_grid[row][col] = valid_rotations[0][0]
-                        unique_actions.append(valid_rotations[0])
+            else:
+                # Skip the explored positions, which stay explored in every state that follows
+                order = cell_order(self.branching, board.num_rows)
+                cursor = board.cursor
+                while cursor < len(order) and board.cells[order[cursor][0]][order[cursor][1]] & FIXED:
+                    cursor += 1
+                board.cursor = cursor
+
+                # If every position is explored, there is nothing left to do
+                if cursor == len(order):
+                    return []
+                row, col = order[cursor]
 
-        # Return the unique actions
-        return [unique_actions]
+            # Branch on each valid rotation of the chosen piece
+            actions = [[rotation] for rotation in board.get_valid_rotations(board.cells[row][col], row, col)]
+
+        if self.probe and len(actions) > 1:
+            actions = self.probe_actions(state, actions)
+        if self.values != 'given' and len(actions) > 1:
+            actions = self.order_values(state, actions)
+        return actions
+
+    def order_values(self, state: PipeManiaState, actions: list) -> list:
+        """
+        Sorts the actions of a state so that the least constraining ones come first: the ones that remove
+        the fewest rotations from the domains of the neighbors, or that make propagation place the fewest
+        pieces. With propagation, the actions that invalidate the board come last.
+
+        Args:
+            state (PipeManiaState): The current state of the Pipe Mania puzzle.
+            actions (list): The actions to sort.
+
+        Returns:
+            list: The same actions, least constraining first, in their previous order for the same score.
+        """
+        board = state.board
+        if self.values == 'neighbors':
+            return sorted(actions, key=lambda action: sum(board.removed_options(row, col, PIECE_CODES[rotation])
+                                                          for rotation, row, col in action))
+
+        # Apply each action and count the pieces it places, restoring the board after each one
+        trail = board.trail
+        scores = []
+        for action in actions:
+            checkpoint = board.checkpoint()
+            self.apply(state, action)
+            scores.append(float('inf') if board.invalid else board.action_count)
+            board.undo(checkpoint)
+
+        # Stop recording the cells if the board did not record them before scoring
+        board.trail = trail
+        return [action for _, action in sorted(zip(scores, actions), key=lambda pair: pair[0])]
+
+    def binary_actions(self, state: PipeManiaState) -> list:
+        """
+        Finds the rotations forced by the unexplored cells left with two valid rotations. Each such cell is
+        a boolean variable, and each pair of rotations of two neighbor cells that disagree about the
+        connection between them is a clause that forbids both, so the cells form a 2-SAT problem.
+        The constraints with the other cells are left out, so the rotations it forces hold in every
+        solution of the board, and a board whose 2-SAT problem has no solution is marked as invalid.
+
+        Args:
+            state (PipeManiaState): The current state of the Pipe Mania puzzle.
+
+        Returns:
+            list: A list of (piece, row, col) actions, one per forced rotation.
+        """
+        board = state.board
+        cells = board.cells
+
+        # One variable per cell with two valid rotations: literal 2 * v places its first rotation, 2 * v + 1 its second
+        variables = {}
+        rotations = []
+        for row in range(board.num_rows):
+            for col in range(board.num_cols):
+                cell = cells[row][col]
+                domain = (cell & DOMAIN) >> DOMAIN_SHIFT
+                if not cell & FIXED and bin(domain).count('1') == 2:
+                    variables[(row, col)] = len(rotations)
+                    rotations.append(DOMAIN_ROTATIONS[(cell & CODE) >> CLASS_SHIFT][domain])
+
+        # Neither of two rotations that disagree about a connection can hold along with the other
+        implications = [[] for _ in range(2 * len(rotations))]
+        for (row, col), variable in variables.items():
+            for direction, opposite, neighbor in ((DOWN, UP, variables.get((row + 1, col))),
+                                                  (RIGHT, LEFT, variables.get((row, col + 1)))):
+                if neighbor is None:
+                    continue
+                for i, rotation in enumerate(rotations[variable]):
+                    for j, neighbor_rotation in enumerate(rotations[neighbor]):
+                        if bool(rotation & direction) != bool(neighbor_rotation & opposite):
+                            implications[2 * variable + i].append(2 * neighbor + j ^ 1)
+                            implications[2 * neighbor + j].append(2 * variable + i ^ 1)
+
+        forced = forced_literals(implications)
+        if forced is None:
+            board.invalid = True
+            return []
+        positions = list(variables)
+        return [(PIECE_NAMES[rotations[literal >> 1][literal & 1]], *positions[literal >> 1]) for literal in forced]
+
+    def probe_actions(self, state: PipeManiaState, actions: list) -> list:
+        """
+        Applies each action to the board of the state and propagates it, keeping only the actions
+        that do not invalidate the board. The board is restored after each action. If no action
+        survives, the board is marked as invalid.
+
+        Args:
+            state (PipeManiaState): The current state of the Pipe Mania puzzle.
+            actions (list): The actions to probe.
+
+        Returns:
+            list: The actions that survived the probing.
+        """
+        board = state.board
+        trail = board.trail
+
+        survivors = []
+        for action in actions:
+            checkpoint = board.checkpoint()
+            self.apply(state, action)
+            if not board.invalid:
+                survivors.append(action)
+            board.undo(checkpoint)
+
+        # Stop recording the cells if the board did not record them before probing
+        board.trail = trail
+        if not survivors:
+            board.invalid = True
+        return survivors
+
+    def vectorized_actions(self, state: PipeManiaState):
+        """
+        Returns the actions of a state whose board works on the whole board at once. The domains
+        were already narrowed by the sweeps of propagate, so this only branches on a cell.
+
+        Args:
+            state (PipeManiaState): The current state of the Pipe Mania puzzle.
+
+        Returns:
+            list: A list of actions that can be executed from the given state.
+        """
+        return [[action] for action in state.board.branch_rotations(self.branching)]
                          
     def goal_test(self, state: PipeManiaState)-> bool:
 
@@ -1125,63 +3122,37 @@ class PipeMania(Problem):
             bool: True if the state is a goal state, False otherwise.
         """
 
-        # Check if the board is fully explored
-        if state.board.explored_count != state.board.board_size:
+        # Check if the board is fully explored, without unpacking a snapshot
+        if state.contents.explored_count != state.contents.board_size:
             return False
         
-        # If last action is None
-        if len(state.board.last_action) == 0:
-            return self.bfs(state, (0,0))
-        
-        # Check if the last action is list
-        if isinstance(state.board.last_action, list):
-            return self.bfs(state, (state.board.last_action[-1][1], state.board.last_action[-1][2]))
-        elif isinstance(state.board.last_action, tuple):
-            return self.bfs(state, (state.board.last_action[1], state.board.last_action[2]))
-   
-    def bfs(self, state, source):
+        # Boards backed by arrays check the whole board at once
+        if state.board.vectorized:
+            return self.vectorized_goal_test(state)
+
+        # The pieces form a single tree when their connections merged them into one component
+        # without closing a cycle, which would have marked the board as invalid
+        board = state.board
+        if board.invalid or board.components.count != 1:
+            board.invalid = True
+            return False
+        return True
+
+    def vectorized_goal_test(self, state: PipeManiaState) -> bool:
         """
-        Perform a BFS traversal from a given position to check if all positions are connected.
-        This BFS ensures that each node is visited exactly once and doesn't form cycles.
+        Checks if a fully explored board that works on the whole board at once is a goal state.
 
         Args:
-            state: The current state of the board.
-            source: The starting position (row, col) for the BFS traversal.
+            state (PipeManiaState): The state to be tested.
 
         Returns:
-            bool: True if all explored positions are connected and no cycles are detected, False otherwise.
+            bool: True if the state is a goal state, False otherwise.
         """
-        num_rows = state.board.num_rows
-        num_cols = state.board.num_cols
-        visited = [[False for _ in range(num_cols)] for _ in range(num_rows)]
-        queue = deque([(source, None)])  # Store (current_node, previous_node)
-
-        while queue:
-            (row, col), prev = queue.popleft()
-            
-            if visited[row][col]:
-                continue
-            
-            visited[row][col] = True
-
-            reachable_positions = state.board.get_reachable_explored(row, col)
-            for next_row, next_col in reachable_positions:
-                if (next_row, next_col) != prev:
-                    if visited[next_row][next_col]:
-                        state.board.invalid = True
-                        return False  # Found a cycle
-                    queue.append(((next_row, next_col), (row, col)))
-
-        # Check if all explored positions have been visited
-        for r in range(num_rows):
-            for c in range(num_cols):
-                if state.board.explored_grid[r][c] != ' ' and not visited[r][c]:
-                    state.board.invalid = True
-                    return False # Not all positions are connected
-
-        state.board.invalid = True
+        if not state.board.is_solved():
+            state.board.invalid = True
+            return False
         return True
-                                        
+
     def result(self, state: PipeManiaState, action):
 
         """
@@ -1198,52 +3169,144 @@ class PipeMania(Problem):
         # Mark parent as invalid since it has been explored
         state.board.invalid = True
 
-        # Create a copy of the board to modify
-        new_grid = [row[:] for row in state.board.grid]
-        new_board = Board(new_grid)
+        # Create a copy of the board to modify, sharing the rows that the action does not touch
+        new_state = PipeManiaState(state.board.copy())
+        self.apply(new_state, action)
 
-        # Copy the board attributes
-        new_board.unique_to_be_explored = state.board.unique_to_be_explored
+        # Keep only a snapshot of the board while the state waits in the frontier
+        if self.packed:
+            new_state.contents = new_state.board.pack()
+        return new_state
 
-        new_board.action_count = len(action)
+    def apply(self, state: PipeManiaState, action):
+        """
+        Executes the given action on the given state, modifying its board in place.
 
-        new_board.explored_count = state.board.explored_count
+        Args:
+            state (PipeManiaState): The state to modify.
+            action (tuple): The action to be executed, consisting of new rotation, row, and column.
+        """
+        board = state.board
+        explored_count = board.explored_count
 
         # Copy the action that led to the new state
-        new_board.last_action = action
-
-        # Copy explored positions
-        new_board.explored_grid = [row[:] for row in state.board.explored_grid]  
+        board.last_action = action
 
         if len(action) == 3 and isinstance(action[0], str):
-            new_board.grid[action[1]][action[2]] = action[0]
-
-            # Add them to the explored grid
-            new_board.explored_grid[action[1]][action[2]] = action[0]
-            new_board.explored_count += 1
+            # Place the piece and add it to the explored positions
+            board.fix(action[1], action[2], PIECE_CODES[action[0]])
 
         else:
             for rotation in action:   
-                new_board.grid[rotation[1]][rotation[2]] = rotation[0]
+                # Place the piece and add it to the explored positions
+                board.fix(rotation[1], rotation[2], PIECE_CODES[rotation[0]])
+
+        # Place the pieces left with a single valid rotation
+        self.propagate(board)
+
+        # Count the pieces placed by the action, including the ones it forced
+        board.action_count = board.explored_count - explored_count
+
+    def checkpoint(self, state: PipeManiaState) -> tuple:
+        """
+        Marks the current state, so that the actions applied to it afterwards can be undone.
+
+        Args:
+            state (PipeManiaState): The state to mark.
+
+        Returns:
+            tuple: The checkpoint of the board of the state.
+        """
+        return state.board.checkpoint()
 
-                # Add them to the explored grid
-                new_board.explored_grid[rotation[1]][rotation[2]] = rotation[0]
-                new_board.explored_count += 1
+    def undo(self, state: PipeManiaState, checkpoint: tuple):
+        """
+        Restores the given state to a checkpoint, undoing the actions applied since then.
 
-        return PipeManiaState(new_board)
+        Args:
+            state (PipeManiaState): The state to restore.
+            checkpoint (tuple): A checkpoint returned by the checkpoint method.
+        """
+        state.board.undo(checkpoint)
 
     def h(self, node: Node):
         """Heuristic function"""
 
+        # The counters are read from the board or its snapshot, without unpacking it
+        board = node.state.contents
+
         # Check if the node is invalid
-        if node.state.board.invalid:
+        if board.invalid:
             # Return a high value to avoid expanding invalid nodes
-            return node.state.board.board_size + 1
-        return node.state.board.board_size - node.state.board.explored_count
+            return board.board_size + 1
+
+        # Connections still missing for a spanning tree, which counts the components left to join
+        return board.missing_connections
+
+# Available board representations
+BACKENDS = {
+    'lists': Board,
+    'numpy': NumpyBoard,
+    'edges': EdgeBoard,
+    'bits': BitBoard,
+}
+
+# Available search algorithms
+SEARCHES = {
+    'greedy': greedy_search,
+    'astar': astar_search,
+    'bfs': breadth_first_tree_search,
+    'dfs': depth_first_tree_search,
+    'dfs-trail': depth_first_trail_search,
+}
+
+# Frontiers that spill to disk, for the searches that keep a queue of states
+SPILLING_QUEUES = {
+    'greedy': SpillingPriorityQueue,
+    'astar': SpillingPriorityQueue,
+    'bfs': SpillingQueue,
+}
 
 if __name__ == "__main__": 
-    board = Board.parse_instance()
-    problem = PipeMania(board)
-    goal_node = greedy_search(problem)
+    parser = argparse.ArgumentParser(description='Solves the PipeMania board read from the standard input.')
+    parser.add_argument('--backend', choices=BACKENDS, default='lists',
+                        help='representation of the board (default: lists)')
+    parser.add_argument('--search', choices=SEARCHES, default='greedy',
+                        help='search algorithm; dfs-trail solves a single board in place (default: greedy)')
+    parser.add_argument('--packed', action='store_true',
+                        help='keep the states waiting in the frontier as packed snapshots, to save memory')
+    parser.add_argument('--probe', action='store_true',
+                        help='try each rotation of a cell before branching on it, and drop the ones that '
+                             'propagation proves invalid')
+    parser.add_argument('--values', choices=('given', 'neighbors', 'propagation'), default='given',
+                        help='order of the rotations of the cell to branch on: as given, or least constraining first, '
+                             'by the rotations removed from its neighbors or by the pieces placed by propagation '
+                             '(default: given)')
+    parser.add_argument('--two-sat', action='store_true',
+                        help='solve the cells left with two valid rotations as a 2-SAT problem before branching')
+    parser.add_argument('--patterns', action='store_true',
+                        help='narrow the domains with the pattern database of the 2x2 windows (lists and edges)')
+    parser.add_argument('--bridges', action='store_true',
+                        help='open the bridges and close the cycles of the connections that may still be open '
+                             '(lists and edges)')
+    parser.add_argument('--branching', choices=list(STATIC_ORDERS) + list(DYNAMIC_ORDERS), default='diagonal',
+                        help='cell to branch on: the first unexplored one in a static order, or the one with the '
+                             'fewest valid rotations (mrv, lists and edges) (default: diagonal)')
+    parser.add_argument('--frontier-limit', type=int, metavar='N',
+                        help='keep at most N states of the frontier in memory and spill the others to a '
+                             'temporary file (greedy, astar and bfs)')
+    args = parser.parse_args()
+
+    search = SEARCHES[args.search]
+    if args.frontier_limit:
+        if args.search not in SPILLING_QUEUES:
+            parser.error('--frontier-limit requires one of the searches ' + ', '.join(SPILLING_QUEUES))
+        queue = functools.partial(SPILLING_QUEUES[args.search], max_items=args.frontier_limit, item_type=Node)
+        search = functools.partial(search, queue=queue)
+
+    board = BACKENDS[args.backend].parse_instance()
+    problem = PipeMania(board, packed=args.packed, probe=args.probe, two_sat=args.two_sat, patterns=args.patterns,
+                        bridges=args.bridges, branching=args.branching, values=args.values)
+    goal_node = search(problem)
     goal_node.state.board.print()
     pass
\ No newline at end of file
@@ -0,0 +1,817 @@
+"""
+Frozen copy of the if/elif rules that the rule tables of pipe.py were compiled from, as they were before
+the tables replaced them: the valid_*_actions functions of each position, the valid_actions_with_*_neighbor
+functions of each explored neighbor and piece_restrictions for the F neighbors. The functions are kept
+exactly as they were, only moved from Board to ReferenceRules, so that check_rules.py can compare the
+tables against them. Do not edit them along with pipe.py.
+"""
+
+from pipe import (
+    CLASS_SHIFT, CODE, DOWN, FIXED, FORK, LEFT, LOCKING, RETURN, RIGHT, ROTATIONS, STRAIGHT, UP,
+    BB, BC, BD, BE, FB, FC, FD, FE, LH, LV, VB, VC, VD, VE,
+)
+
+class ReferenceRules:
+    """
+    Board cells with the original rules to find the valid rotations of a piece.
+    """
+
+    def __init__(self, cells: list):
+        """
+        Initializes a ReferenceRules object over a grid of cells.
+
+        Args:
+            cells (list): The cells of the board, as rows of piece codes with the FIXED flag.
+        """
+        self.cells = cells
+        self.num_rows = len(cells)
+        self.num_cols = len(cells[0])
+
+    def is_corner_upper_right(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is the upper right corner of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is the upper right corner, False otherwise.
+        """
+        return row == 0 and col == self.num_cols - 1
+    
+    def is_corner_upper_left(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is the upper left corner of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is the upper left corner, False otherwise.
+        """
+        return row == 0 and col == 0
+    
+    def is_corner_lower_right(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is the lower right corner of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is the lower right corner, False otherwise.
+        """
+        return row == self.num_rows - 1 and col == self.num_cols - 1
+    
+    def is_corner_lower_left(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is the lower left corner of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is the lower left corner, False otherwise.
+        """
+        return row == self.num_rows - 1 and col == 0
+    
+    def is_edge_upper(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is on the upper edge of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is on the upper edge, False otherwise.
+        """
+        return row == 0
+    
+    def is_edge_lower(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is on the lower edge of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is on the lower edge, False otherwise.
+        """
+        return row == self.num_rows - 1
+    
+    def is_edge_left(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is on the left edge of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is on the left edge, False otherwise.
+        """
+        return col == 0
+    
+    def is_edge_right(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is on the right edge of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is on the right edge, False otherwise.
+        """
+        return col == self.num_cols - 1
+
+    def is_border(self, row: int, col: int) -> bool:
+        """
+        Checks if the position is on the outer border of the grid.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            bool: True if the position is on any edge or corner, False otherwise.
+        """
+        return row == 0 or col == 0 or row == self.num_rows - 1 or col == self.num_cols - 1
+
+    # Valid Actions Determination Functions Based on Position
+
+    def valid_upper_left_corner_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the upper left corner of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the upper left corner.
+        """
+        # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FB, FD]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VB]
+        
+    def valid_upper_right_corner_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the upper right corner of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the upper right corner.
+        """
+         # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FB, FE]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VE]
+        
+    def valid_lower_left_corner_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the lower left corner of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the lower left corner.
+        """
+         # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FC, FD]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VD]
+         
+    def valid_lower_right_corner_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the lower right corner of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the lower right corner.
+        """
+         # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FC, FE]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VC]
+        
+    def valid_upper_edge_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the upper edge of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the upper edge.
+        """
+        # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FB, FD, FE]
+        
+        # See if it is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+            return [BB]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VB, VE]
+        
+        # See if it is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+            return [LH]
+        
+    def valid_lower_edge_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the lower edge of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the lower edge.
+        """
+        # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FC, FD, FE]
+        
+        # See if it is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+            return [BC]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VD, VC]
+        
+        # See if piece is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+            return [LH]
+            
+    def valid_left_edge_actions(piece: int):
+        """
+        Determines valid actions for a piece located at the left edge of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the left edge.
+        """
+        # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FC, FB, FD]
+        
+        # See if it is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+            return [BD]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VB, VD]
+        
+        # See if it is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+            return [LV]
+        
+    def valid_right_edge_actions(piece: int):    
+        """
+        Determines valid actions for a piece located at the right edge of the grid.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of valid actions for the piece at the right edge.
+        """   
+        # See if it is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+            return [FC, FB, FE]
+        
+        # See if it is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+            return [BE]
+        
+        # See if it a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+            return [VE, VC]
+        
+        # See if it is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+            return [LV]
+
+    # Valid Actions Determination Functions Based on Neighbors
+
+    def valid_actions_with_upper_neighbor(piece: int, upper_neighbor: int):
+        """
+        Returns valid actions for a piece considering the correct orientation of the upper neighbor.
+
+        Args:
+            piece (int): The piece code.
+            upper_neighbor (int): The piece code of the upper neighbor.
+
+        Returns:
+            list: A list of valid actions for the piece.
+        """
+        # If the piece is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+
+            # If the upper neighbor is connected to the lower neighbor
+            if upper_neighbor & DOWN:
+                return [FC]
+            
+            
+            # If the upper neighbor is not connected to the lower neighbor
+            else:
+                return [FB, FE, FD]
+        
+        # If piece is a fork pipe
+        elif piece >> CLASS_SHIFT == FORK:
+
+            # If the upper neighbor is connected to the lower neighbor
+            if upper_neighbor & DOWN:
+                return [BC, BE, BD]
+            
+            # If the upper neighbor is not connected to the lower neighbor
+            else:
+                return [BB]
+        
+        # If piece is a return pipe 
+        elif piece >> CLASS_SHIFT == RETURN:
+
+            # If the upper neighbor is connected to the lower neighbor
+            if upper_neighbor & DOWN:
+                return [VC, VD]
+            
+            # If the upper neighbor is not connected to the lower neighbor
+            else:
+                return [VB, VE]
+            
+        # If piece is a straight pipe
+        elif piece >> CLASS_SHIFT == STRAIGHT:
+
+            # If the upper neighbor is connected to the lower neighbor
+            if upper_neighbor & DOWN:
+                return [LV]
+            
+            # If the upper neighbor is not connected to the lower neighbor
+            else:
+                return [LH]
+        
+        return []
+    
+    def valid_actions_with_lower_neighbor(piece: int, lower_neighbor: int):
+        """
+        Returns valid actions for a piece considering the correct orientation of the lower neighbor.
+
+        Args:
+            piece (int): The piece code.
+            lower_neighbor (int): The piece code of the lower neighbor.
+
+        Returns:
+            list: A list of valid actions for the piece.
+        """
+        # If the piece is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+
+            # If the lower neighbor is not connected to the upper neighbor
+            if not lower_neighbor & UP:
+                return [FC, FE, FD]        
+            
+            # If the lower neighbor is connected to the upper neighbor
+            else:
+                return [FB] 
+            
+        # If piece is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+
+            # If the lower neighbor is not connected to the upper neighbor
+            if not lower_neighbor & UP:
+                return [BC] 
+            
+            # If the lower neighbor is connected to the upper neighbor
+            else:
+                return [BB, BE, BD] 
+            
+        # If piece is a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+
+            # If the lower neighbor is not connected to the upper neighbor
+            if not lower_neighbor & UP:
+                return [VC, VD] 
+            
+            # If the lower neighbor is connected to the upper neighbor
+            else:
+                return [VB, VE] 
+            
+        # If piece is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+
+            # If the lower neighbor is not connected to the upper neighbor
+            if not lower_neighbor & UP:
+                return [LH] 
+            
+            # If the lower neighbor is connected to the upper neighbor
+            else:
+                return [LV] 
+            
+    def valid_actions_with_left_neighbor(piece: int, left_neighbor: int):
+        """
+        Returns valid actions for a piece considering the correct orientation of the left neighbor.
+
+        Args:
+            piece (int): The piece code.
+            left_neighbor (int): The piece code of the left neighbor.
+
+        Returns:
+            list: A list of valid actions for the piece.
+        """  
+        # If the piece is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+
+            # If the left neighbor is connected to the right neighbor
+            if left_neighbor & RIGHT:
+                return [FE] 
+            
+            # If the left neighbor is not connected to the right neighbor
+            else:
+                return [FB, FC, FD]
+        
+        # If piece is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+
+            # If the left neighbor is connected to the right neighbor
+            if left_neighbor & RIGHT:
+                return [BC, BE, BB]
+            
+            # If the left neighbor is not connected to the right neighbor
+            else:
+                return [BD]
+        
+        # If piece is a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+
+            # If the left neighbor is connected to the right neighbor
+            if left_neighbor & RIGHT:
+                return [VC, VE]
+            
+            # If the left neighbor is not connected to the right neighbor
+            else:
+                return [VB, VD]
+        
+        # If piece is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+
+            # If the left neighbor is connected to the right neighbor
+            if left_neighbor & RIGHT:
+                return [LH]
+            
+            # If the left neighbor is not connected to the right neighbor
+            else:
+                return [LV]
+
+        return []
+
+    def valid_actions_with_right_neighbor(piece: int, right_neighbor: int):
+        """
+        Returns valid actions for a piece considering the correct orientation of the right neighbor.
+
+        Args:
+            piece (int): The piece code.
+            right_neighbor (int): The piece code of the right neighbor.
+
+        Returns:
+            list: A list of valid actions for the piece.
+        """
+        # If the piece is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+
+            # If the right neighbor is  connected to the left neighbor
+            if right_neighbor & LEFT:
+                return [FD]
+            
+            # If the right neighbor is not connected to the left neighbor
+            else:
+                return [FB, FE, FC] 
+            
+        # If piece is a fork pipe
+        if piece >> CLASS_SHIFT == FORK:
+
+            # If the right neighbor is connected to the left neighbor
+            if right_neighbor & LEFT:
+                return [BC, BB, BD]
+            
+            # If the right neighbor is not connected to the left neighbor
+            else:
+                return [BE]
+        
+        # If piece is a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+
+            # If the right neighbor is connected to the left neighbor
+            if right_neighbor & LEFT:
+                return [VB, VD]
+            
+            # If the right neighbor is not connected to the left neighbor
+            else:
+                return [VC, VE]
+        
+        # If piece is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+
+            # If the right neighbor is connected to the left neighbor
+            if right_neighbor & LEFT:
+                return [LH]
+            
+            # If the right neighbor is not connected to the left neighbor
+            else:
+                return [LV]
+
+        return []
+    
+    # Rotation Functions
+    
+    def get_all_rotations(self, piece: int):
+        """
+        Returns all possible rotations for a piece.
+
+        Args:
+            piece (int): The piece code.
+
+        Returns:
+            list: A list of all possible rotations for the piece.
+        """
+        # Return possible rotations for the class of the given piece
+        return ROTATIONS[(piece & CODE) >> CLASS_SHIFT]
+
+    def piece_restrictions(self, row: int, col: int) -> list:
+        """
+        Returns valid rotations based on the types of pieces in the neighbors of the given position.
+
+        Args:
+            row (int): The row index of the position.
+            col (int): The column index of the position.
+
+        Returns:
+            list: A list of valid rotations based on the F pieces in the neighbors.
+        """
+
+        cells = self.cells
+        piece = cells[row][col] & CODE
+        neighbors_count = 0
+
+        # Neighbors that are F pieces
+        upper = False
+        lower = False
+        left = False
+        right = False
+
+        # Returns [upper, lower, left, right] neighbors that are F pieces
+        if row > 0:
+            # If upper neighbor is a locking pipe
+            if (cells[row-1][col] & CODE) >> CLASS_SHIFT == LOCKING:
+                upper = True
+                neighbors_count += 1
+        
+        if row < self.num_rows - 1:
+            # If lower neighbor is a locking pipe
+            if (cells[row+1][col] & CODE) >> CLASS_SHIFT == LOCKING:
+                lower = True
+                neighbors_count += 1
+
+        if col > 0:
+            # If left neighbor is a locking pipe
+            if (cells[row][col-1] & CODE) >> CLASS_SHIFT == LOCKING:
+                left = True
+                neighbors_count += 1
+
+        if col < self.num_cols - 1:
+            # If right neighbor is a locking pipe
+            if (cells[row][col+1] & CODE) >> CLASS_SHIFT == LOCKING:
+                right = True
+                neighbors_count += 1
+        
+        # If piece is a locking pipe
+        if piece >> CLASS_SHIFT == LOCKING:
+
+            # If there is only one F neighbor
+            if neighbors_count == 1:
+                if upper == True:
+                    return [FB, FE, FD]
+                if left == True:
+                    return [FC, FD, FB]
+                if lower == True:
+                    return [FC, FE, FD]
+                if right == True:
+                    return [FC, FB, FE]
+            
+            # If there are two F neighbors
+            if neighbors_count == 2:
+                if upper == True and lower == True:
+                    return [FE, FD]
+                if left == True and right == True:
+                    return [FC, FB]
+                if upper == True and right == True:
+                    return [FE, FB]
+                if upper == True and left == True:
+                    return [FD, FB]
+                if lower == True and right == True:
+                    return [FE, FC]
+                if lower == True and left == True:
+                    return [FD, FC]
+            
+            # If there are three F neighbors
+            if neighbors_count == 3:
+                if upper == False:
+                    return [FC]
+                if lower == False:
+                    return [FB]
+                if left == False:
+                    return [FE]
+                if right == False:
+                    return [FD]
+            
+        # If the piece is a return pipe
+        if piece >> CLASS_SHIFT == RETURN:
+
+            # If there is only two F neighbor
+            if neighbors_count == 2:
+                if upper == True and right == True:
+                    return [VC, VE, VB]
+                if upper == True and left == True:
+                    return [VD, VE, VB]
+                if lower == True and right == True:
+                    return [VC, VD, VE]
+                if lower == True and left == True:
+                    return [VC, VD, VB]
+            
+            # If there are three F neighbors
+            if neighbors_count == 3:
+                if upper == False:
+                    return [VC, VD]
+                if lower == False:
+                    return [VB, VE]
+                if left == False:
+                    return [VC, VE]
+                if right == False:
+                    return [VD, VB]
+
+        # If the piece is a straight pipe
+        if piece >> CLASS_SHIFT == STRAIGHT:
+
+            # If there is only two F neighbor
+            if neighbors_count == 2:
+                if upper == True and lower == True:
+                    return [LH]
+                if left == True and right == True:
+                    return [LV]
+                
+            # If there are three F neighbors
+            if neighbors_count == 3:
+                if upper == False:
+                    return [LV]
+                if lower == False:
+                    return [LV]
+                if left == False:
+                    return [LH]
+                if right == False:
+                    return [LH]
+        
+        return self.get_all_rotations(piece)
+
+    def get_valid_rotations_pos(self, piece: int, row: int, col: int) -> list:     
+        """
+        Returns valid rotations of a piece based on the limits of the grid.
+
+        Args:
+            piece (int): The piece code.
+            row (int): The row index of the piece on the grid.
+            col (int): The column index of the piece on the grid.
+
+        Returns:
+            list: A list of valid rotations for the piece at the specified position.
+        """  
+        valid_rotations = []
+        # Check if the piece is a upper left corner
+        if self.is_corner_upper_left(row, col):
+            valid_rotations.append(ReferenceRules.valid_upper_left_corner_actions(piece))
+
+        # Check if the piece is a upper right corner
+        elif self.is_corner_upper_right(row, col):
+            valid_rotations.append(ReferenceRules.valid_upper_right_corner_actions(piece))
+
+        # Check if the piece is a lower left corner
+        elif self.is_corner_lower_left(row, col):
+            valid_rotations.append(ReferenceRules.valid_lower_left_corner_actions(piece))
+
+        # Check if the piece is a lower right corner
+        elif self.is_corner_lower_right(row, col):
+            valid_rotations.append(ReferenceRules.valid_lower_right_corner_actions(piece))
+
+        # Check if the piece is an upper edge
+        elif self.is_edge_upper(row, col) and not (self.is_corner_upper_left(row, col) or self.is_corner_upper_right(row, col)):
+            valid_rotations.append(ReferenceRules.valid_upper_edge_actions(piece))
+
+        # Check if the piece is a lower edge
+        elif self.is_edge_lower(row, col) and not (self.is_corner_lower_left(row, col) or self.is_corner_lower_right(row, col)):
+            valid_rotations.append(ReferenceRules.valid_lower_edge_actions(piece))
+
+        # Check if the piece is a upper edge
+        elif self.is_edge_left(row, col) and not (self.is_corner_upper_left(row, col) or self.is_corner_upper_right(row, col)):
+            valid_rotations.append(ReferenceRules.valid_left_edge_actions(piece))
+
+        # Check if the piece is a right edge
+        elif self.is_edge_right(row, col) and not (self.is_corner_upper_right(row, col) or self.is_corner_lower_right(row, col)):
+            valid_rotations.append(ReferenceRules.valid_right_edge_actions(piece))
+
+        # Join all the valid rotations into single array
+        valid_rot = []
+        for rot in valid_rotations:
+            if rot:
+                valid_rot.extend(rot)
+
+        return valid_rot
+    
+    def get_valid_rotations_neighbors(self, piece: int, row: int, col: int) -> list:
+        """
+        Returns valid positions based on neighbors that are already in their final position.
+
+        Args:
+            piece (int): The piece code.
+            row (int): The row index of the piece on the grid.
+            col (int): The column index of the piece on the grid.
+
+        Returns:
+            list: A list of valid rotations based on the neighboring pieces.
+        """
+
+        cells = self.cells
+
+        # Start from every rotation and narrow it down with each explored neighbor
+        intersect_rotations = self.get_all_rotations(piece)
+
+        # See if upper neighbor is in the correct orientation 
+        if row > 0:
+            neighbor = cells[row-1][col]
+            if neighbor & FIXED:
+                
+                # Get the valid rotations based on the upper neighbor
+                upper = ReferenceRules.valid_actions_with_upper_neighbor(piece, neighbor)
+                intersect_rotations = [value for value in intersect_rotations if value in upper]
+
+        # See if lower neighbor is in the correct orientation
+        if row < self.num_rows - 1:
+            neighbor = cells[row+1][col]
+            if neighbor & FIXED:
+
+                # Get the valid rotations based on the lower neighbor
+                lower = ReferenceRules.valid_actions_with_lower_neighbor(piece, neighbor)
+                intersect_rotations = [value for value in intersect_rotations if value in lower]
+        
+        # See if left neighbor is in the correct orientation
+        if col > 0:
+            neighbor = cells[row][col-1]
+            if neighbor & FIXED:
+
+                # Get the valid rotations based on the left neighbor
+                left = ReferenceRules.valid_actions_with_left_neighbor(piece, neighbor)
+                intersect_rotations = [value for value in intersect_rotations if value in left]
+
+        # See if right neighbor is in the correct orientation
+        if col < self.num_cols - 1:
+            neighbor = cells[row][col+1]
+            if neighbor & FIXED:
+
+                # Get the valid rotations based on the right neighbor
+                right = ReferenceRules.valid_actions_with_right_neighbor(piece, neighbor)
+                intersect_rotations = [value for value in intersect_rotations if value in right]
+
+        # Check if piece (except B pieces) have F pieces in the neighbors
+        f_neighbor_restrictions = self.piece_restrictions(row, col)
+        
+        # Intersect the valid rotations with the F piece restrictions
+        if f_neighbor_restrictions != None:
+            intersect_rotations = [value for value in intersect_rotations if value in f_neighbor_restrictions]
+        return intersect_rotations
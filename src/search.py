@@ -38,6 +38,21 @@ class Problem:
         self.actions(state)."""
         raise NotImplementedError
 
+    def apply(self, state, action):
+        """Execute the given action on the given state, modifying it in place.
+        Together with checkpoint and undo, this lets searches such as
+        depth_first_trail_search work on a single state."""
+        raise NotImplementedError
+
+    def checkpoint(self, state):
+        """Return a marker of the current contents of the state, to be
+        passed to undo to discard every change made by apply afterwards."""
+        raise NotImplementedError
+
+    def undo(self, state, checkpoint):
+        """Restore the state to the given checkpoint."""
+        raise NotImplementedError
+
     def goal_test(self, state):
         """Return True if the state is a goal. The default method compares the
         state to self.goal or checks for state in self.goal if it is a
@@ -73,7 +88,11 @@ class Node:
     the total path_cost (also known as g) to reach the node. Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    subclass this class.
+    Nodes use __slots__, with dedicated slots for the cached f and h values,
+    so that a frontier of many nodes carries no per-node dictionary."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
@@ -175,16 +194,17 @@ class SimpleProblemSolvingAgentProgram:
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+def breadth_first_tree_search(problem, queue=deque):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
-    The argument frontier should be an empty queue.
+    The argument queue builds the frontier from its initial items; it should
+    be a FIFO queue with append, extend and popleft, such as SpillingQueue.
     Repeats infinitely in case of loops.
     """
 
-    frontier = deque([Node(problem.initial)])  # FIFO queue
+    frontier = queue([Node(problem.initial)])  # FIFO queue
 
     while frontier:
         node = frontier.popleft()
@@ -209,7 +229,42 @@ def depth_first_tree_search(problem):
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
-        frontier.extend(node.expand(problem))
+        # Push the children in reverse, so that the first action is the first one tried
+        frontier.extend(reversed(node.expand(problem)))
+    return None
+
+
+def depth_first_trail_search(problem):
+    """
+    Search the deepest nodes in the search tree first, like depth_first_tree_search,
+    but over a single state that is modified in place instead of a fresh state per node.
+    The problem must implement apply(state, action), which executes the action on the
+    state, checkpoint(state), which marks the current state, and undo(state, checkpoint),
+    which restores the state to a checkpoint. Backtracking unwinds the state to the
+    checkpoint of the level it returns to, so only the current path is kept in memory.
+    Returns a Node with the goal state, without the path that led to it.
+    """
+
+    state = problem.initial
+    if problem.goal_test(state):
+        return Node(state)
+
+    # Each level keeps its remaining actions and the checkpoint taken once they were computed
+    actions = problem.actions(state)
+    frontier = [(iter(actions), problem.checkpoint(state))]  # Stack
+
+    while frontier:
+        remaining, checkpoint = frontier[-1]
+        action = next(remaining, None)
+        problem.undo(state, checkpoint)
+        if action is None:
+            frontier.pop()
+            continue
+        problem.apply(state, action)
+        if problem.goal_test(state):
+            return Node(state)
+        actions = problem.actions(state)
+        frontier.append((iter(actions), problem.checkpoint(state)))
     return None
 
 
@@ -257,17 +312,19 @@ def breadth_first_graph_search(problem):
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def best_first_graph_search(problem, f, display=False, queue=PriorityQueue):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    The argument queue builds the frontier from an order and f, like
+    PriorityQueue or SpillingPriorityQueue."""
     f = memoize(f, 'f')
     node = Node(problem.initial)
-    frontier = PriorityQueue('min', f)
+    frontier = queue('min', f)
     frontier.append(node)
     explored = set()
     while frontier:
@@ -410,17 +467,17 @@ greedy_best_first_graph_search = best_first_graph_search
 
 
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
-def greedy_search(problem, h=None):
+def greedy_search(problem, h=None, queue=PriorityQueue):
     """f(n) = h(n)"""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, h)
+    return best_first_graph_search(problem, h, queue=queue)
 
-def astar_search(problem, h=None, display=False):
+def astar_search(problem, h=None, display=False, queue=PriorityQueue):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display, queue)
 
 
 # ______________________________________________________________________________
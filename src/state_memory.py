@@ -0,0 +1,142 @@
+"""
+Measures the memory of the search states with and without __slots__, and writes report/state_memory.csv.
+
+Both variants are measured on the current code. The __dict__ variant rebuilds Board, PipeManiaState
+and search.Node from the namespace of each class without its __slots__, so that their attributes are
+kept in a per-instance dictionary, and puts them in place of the originals in pipe and search. A plain
+subclass would not do, as the attributes of the slotted base class would stay in its slots. Every board
+in tests/ is measured in a fresh interpreter for each variant:
+    state_bytes: the size of the Board, PipeManiaState and Node of the initial state,
+        each with its __dict__ when it has one, excluding the cell rows and other tables shared between
+        boards. It only depends on the attributes of the classes, so it is the same for every board.
+    peak_mem: the peak memory traced by tracemalloc while the board is parsed and solved by greedy_search,
+        in MB. Propagation solves most boards before the search expands any node, so it mostly measures
+        the boards built on the way. The interpreters run with a fixed hash seed and the median of
+        REPEATS runs is kept.
+
+Usage:
+    python3 src/state_memory.py
+"""
+
+import csv
+import glob
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tracemalloc
+
+import pipe
+import search
+
+# Number of runs of each board with each variant
+REPEATS = 5
+
+# Variants of the state classes, in the order of the columns of the table
+VARIANTS = ('dict', 'slots')
+
+def without_slots(cls: type) -> type:
+    """
+    Rebuilds a class without its __slots__, so that its instances keep their attributes in a __dict__.
+
+    Args:
+        cls (type): A class that declares __slots__ and derives directly from object.
+
+    Returns:
+        type: A class with the same name and methods, and no slots.
+    """
+    namespace = {name: value for name, value in vars(cls).items()
+                 if name not in cls.__slots__ and name not in ('__slots__', '__dict__', '__weakref__')}
+    return type(cls.__name__, (object,), namespace)
+
+def use_dict_classes():
+    """
+    Replaces Board, PipeManiaState and Node in pipe and search with their variants without __slots__.
+    """
+    pipe.Board = without_slots(pipe.Board)
+    pipe.PipeManiaState = without_slots(pipe.PipeManiaState)
+    pipe.Node = search.Node = without_slots(search.Node)
+
+def overhead(obj) -> int:
+    """
+    Computes the size of an object and of its __dict__, if it has one.
+
+    Args:
+        obj (object): The object to measure.
+
+    Returns:
+        int: The number of bytes of the object, without the objects it refers to.
+    """
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+
+def measure_instance(instance: str) -> list:
+    """
+    Measures one board with the classes currently in place.
+
+    Args:
+        instance (str): The board, in the text format.
+
+    Returns:
+        list: The number of pipes, the bytes of a state and the peak memory of the solve in bytes.
+    """
+    def problem():
+        sys.stdin = io.StringIO(instance)
+        return pipe.PipeMania(pipe.Board.parse_instance())
+
+    node = search.Node(problem().initial)
+    board = node.state.board
+    state_bytes = overhead(node) + overhead(node.state) + overhead(board)
+
+    tracemalloc.start()
+    search.greedy_search(problem())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return [board.board_size, state_bytes, peak]
+
+def measure(variant: str, test: str) -> tuple:
+    """
+    Measures a board with a variant, taking the median peak of REPEATS runs.
+
+    Args:
+        variant (str): The variant of the state classes, 'dict' or 'slots'.
+        test (str): The path of the board.
+
+    Returns:
+        tuple: The number of pipes, the bytes of a state, and the peak memory in MB.
+    """
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    runs = []
+    for _ in range(REPEATS):
+        with open(test) as board:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), variant], stdin=board, env=env,
+                                    check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    num_pipes, state_bytes, _ = runs[0]
+    return num_pipes, state_bytes, statistics.median(peak for _, _, peak in runs) / 2**20
+
+if __name__ == "__main__":
+    # Measure a single board from the standard input with one variant
+    if len(sys.argv) > 1:
+        if sys.argv[1] == 'dict':
+            use_dict_classes()
+        print(json.dumps(measure_instance(sys.stdin.read())))
+        sys.exit(0)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for test in sorted(glob.glob(os.path.join(root, 'tests', '*.txt'))):
+        (num_pipes, bytes_dict, peak_dict), (_, bytes_slots, peak_slots) = (measure(variant, test)
+                                                                            for variant in VARIANTS)
+        rows.append((num_pipes, bytes_dict, bytes_slots, peak_dict, peak_slots))
+    rows.sort(key=lambda row: row[0])
+
+    with open(os.path.join(root, 'report', 'state_memory.csv'), 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(['num_pipes', 'state_bytes_dict', 'state_bytes_slots', 'peak_mem_dict', 'peak_mem_slots'])
+        for num_pipes, bytes_dict, bytes_slots, peak_dict, peak_slots in rows:
+            writer.writerow([num_pipes, bytes_dict, bytes_slots, f"{peak_dict:.4f}", f"{peak_slots:.4f}"])
+        averages = [statistics.mean(row[column] for row in rows) for column in range(1, 5)]
+        writer.writerow(['avg_mem', f"{averages[0]:.0f} B", f"{averages[1]:.0f} B",
+                         f"{averages[2]:.4f} MB", f"{averages[3]:.4f} MB"])
@@ -5,9 +5,13 @@ import collections
 import collections.abc
 import functools
 import heapq
+import io
+import mmap
 import operator
 import os.path
+import pickle
 import random
+import tempfile
 from itertools import chain, combinations
 from statistics import mean
 
@@ -724,10 +728,11 @@ class PriorityQueue:
     order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Also supports dict-like lookup, indexed by the hash of the items."""
 
     def __init__(self, order='min', f=lambda x: x):
         self.heap = []
+        self.values = {}
         if order == 'min':
             self.f = f
         elif order == 'max':  # now item with max f(x)
@@ -737,7 +742,9 @@ class PriorityQueue:
 
     def append(self, item):
         """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        value = self.f(item)
+        heapq.heappush(self.heap, (value, item))
+        self.values.setdefault(item, []).append(value)
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -748,7 +755,9 @@ class PriorityQueue:
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
         if self.heap:
-            return heapq.heappop(self.heap)[1]
+            value, item = heapq.heappop(self.heap)
+            self.discount(item, value)
+            return item
         else:
             raise Exception('Trying to pop from empty PriorityQueue.')
 
@@ -758,24 +767,188 @@ class PriorityQueue:
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return key in self.values
 
     def __getitem__(self, key):
-        """Returns the first value associated with key in PriorityQueue.
+        """Returns the lowest value associated with key in PriorityQueue.
         Raises KeyError if key is not present."""
-        for value, item in self.heap:
-            if item == key:
-                return value
-        raise KeyError(str(key) + " is not in the priority queue")
+        if key not in self.values:
+            raise KeyError(str(key) + " is not in the priority queue")
+        return min(self.values[key])
 
     def __delitem__(self, key):
         """Delete the first occurrence of key."""
-        try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
-        except ValueError:
+        if key not in self.values:
             raise KeyError(str(key) + " is not in the priority queue")
+        index = [item == key for _, item in self.heap].index(True)
+        self.discount(self.heap[index][1], self.heap[index][0])
+        del self.heap[index]
         heapq.heapify(self.heap)
 
+    def discount(self, item, value):
+        """Remove one occurrence of item, with the given value, from the index."""
+        values = self.values[item]
+        values.remove(value)
+        if not values:
+            del self.values[item]
+
+
+class SpillFile:
+    """A temporary file of segments, each a list of queue entries serialized with pickle,
+    that are read back through a memory map. Objects referenced by the entries that are not
+    themselves entries (such as the parent of a search node) stay in memory, shared with the
+    rest of the program, instead of being copied into every segment that references them."""
+
+    def __init__(self, entry_type, directory=None):
+        self.entry_type = entry_type
+        self.directory = directory
+        self.file = None
+        self.shared = {}
+
+    def write(self, entries):
+        """Append a segment with the given entries and return its (offset, length)."""
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(dir=self.directory)
+        spilled = {id(item) for _, item in entries}
+
+        def persistent_id(obj):
+            if isinstance(obj, self.entry_type) and id(obj) not in spilled:
+                if id(obj) in self.shared:
+                    self.shared[id(obj)][1] += 1
+                else:
+                    self.shared[id(obj)] = [obj, 1]
+                return id(obj)
+            return None
+
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(entries)
+        self.file.seek(0, os.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(buffer.getbuffer())
+        return offset, buffer.tell()
+
+    def read(self, offset, length):
+        """Read back the entries of the segment at offset."""
+        self.file.flush()
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            data = view[offset:offset + length]
+
+        def persistent_load(key):
+            shared = self.shared[key]
+            shared[1] -= 1
+            if not shared[1]:
+                del self.shared[key]
+            return shared[0]
+
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+    def clear(self):
+        """Discard every segment, once all of them were read back."""
+        if self.file is not None:
+            self.file.truncate(0)
+
+
+class SpillingQueue:
+    """A First-In-First-Out queue that keeps at most max_items items in memory.
+    Every max_items // 2 items appended at the back of the queue are spilled as a segment
+    to a memory-mapped file, and read back when they reach the front.
+    The items must be picklable; item_type names the type of the objects they share
+    with the rest of the program, kept in memory instead of being serialized.
+    Membership tests only see the items in memory."""
+
+    def __init__(self, items=(), max_items=100000, item_type=object, directory=None):
+        self.head = collections.deque()
+        self.tail = collections.deque()
+        self.segments = collections.deque()
+        self.spilled = 0
+        self.segment_size = max(1, max_items // 2)
+        self.spill_file = SpillFile(item_type, directory)
+        self.extend(items)
+
+    def append(self, item):
+        """Add item to the back of the queue."""
+        self.tail.append(item)
+        if len(self.tail) >= self.segment_size:
+            entries = [(None, item) for item in self.tail]
+            self.segments.append(self.spill_file.write(entries) + (len(entries),))
+            self.spilled += len(entries)
+            self.tail.clear()
+
+    def extend(self, items):
+        """Add each item in items to the back of the queue."""
+        for item in items:
+            self.append(item)
+
+    def popleft(self):
+        """Remove and return the item at the front of the queue."""
+        if not self.head:
+            if self.segments:
+                offset, length, count = self.segments.popleft()
+                self.head.extend(item for _, item in self.spill_file.read(offset, length))
+                self.spilled -= count
+                if not self.segments:
+                    self.spill_file.clear()
+            else:
+                return self.tail.popleft()
+        return self.head.popleft()
+
+    def __len__(self):
+        return len(self.head) + self.spilled + len(self.tail)
+
+    def __contains__(self, item):
+        return item in self.head or item in self.tail
+
+
+class SpillingPriorityQueue(PriorityQueue):
+    """A PriorityQueue that keeps at most max_items items in memory.
+    When the heap grows beyond max_items, its worst half is spilled as a segment
+    to a memory-mapped file, and a segment is read back into the heap as soon
+    as it holds an item that should be returned before those in memory.
+    The items must be picklable; item_type names the type of the objects they share
+    with the rest of the program, kept in memory instead of being serialized.
+    Membership tests and lookups only see the items in memory."""
+
+    def __init__(self, order='min', f=lambda x: x, max_items=100000, item_type=object, directory=None):
+        super().__init__(order, f)
+        self.max_items = max(2, max_items)
+        self.segments = []
+        self.spilled = 0
+        self.spill_file = SpillFile(item_type, directory)
+
+    def append(self, item):
+        """Insert item at its correct position, spilling the worst half of the heap when it is full."""
+        super().append(item)
+        if len(self.heap) > self.max_items:
+            self.heap.sort()
+            kept = len(self.heap) // 2
+            entries = self.heap[kept:]
+            del self.heap[kept:]
+            for value, spilled_item in entries:
+                self.discount(spilled_item, value)
+            heapq.heappush(self.segments, (entries[0][0],) + self.spill_file.write(entries) + (len(entries),))
+            self.spilled += len(entries)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order, reading back the spilled segment that holds it if needed."""
+        if self.segments and (not self.heap or self.segments[0][0] < self.heap[0][0]):
+            _, offset, length, count = heapq.heappop(self.segments)
+            for value, item in self.spill_file.read(offset, length):
+                heapq.heappush(self.heap, (value, item))
+                self.values.setdefault(item, []).append(value)
+            self.spilled -= count
+            if not self.segments:
+                self.spill_file.clear()
+        return super().pop()
+
+    def __len__(self):
+        """Return current capacity of SpillingPriorityQueue, including the spilled items."""
+        return len(self.heap) + self.spilled
+
 
 # ______________________________________________________________________________
 # Useful Shorthands